@@ -2,6 +2,7 @@ import asyncio
 import os
 import signal
 import sys
+from collections import deque
 from contextlib import asynccontextmanager
 from datetime import datetime, time
 from zoneinfo import ZoneInfo
@@ -11,8 +12,9 @@ import requests
 import uvicorn
 from discord.ext import tasks
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from Model import ErrorModel, JobResponse
+from fastapi import FastAPI, HTTPException, Request
+from jobschema import JOB_BATCH, BatchAck, ErrorReport, JobBatch, decode
+from scheduler import ALL_SEARCHES, Scheduler
 
 load_dotenv()
 JOBS_CHANNEL_ID = int(os.getenv('JOBS_CHANNEL_ID'))
@@ -36,7 +38,8 @@ async def shutdown_event():
 @client.event
 async def on_ready():
     print(f'Logged in as {client.user}')
-    await run_parser_task.start()
+    run_parser_task.start()
+    shutdown_task.start()
     await client.get_channel(COMMANDS_CHANNEL_ID).send("I'm online :thumbsup:")
 
 @client.event
@@ -53,6 +56,8 @@ async def on_message(message):
         await run_parser()
     elif message.content.startswith('/shutdown'):
         await shutdown()
+    elif message.content.startswith('/stats'):
+        await stats(message)
 
 async def exclude_word(message):
     invalid_message = "Invalid command: /exclude [company|title] ['word']"
@@ -83,13 +88,21 @@ async def exclude_word(message):
     except requests.ConnectionError:
         await message.channel.send(f"Error: unable to connect to parser")
 
-async def run_parser():
+async def run_parser(searches: list[str]=None):
     channel = client.get_channel(COMMANDS_CHANNEL_ID)
+    if scheduler.is_running():
+        await channel.send("Parser is currently running. Try again later.")
+        return
+
+    searches = searches or [ALL_SEARCHES]
     await channel.send("Calling parse API...")
     try:
-        response = requests.get(f"{os.getenv('PARSER_URL')}/run", timeout=10)
+        # no search parameter runs every search
+        params = {"search": searches} if ALL_SEARCHES not in searches else None
+        response = requests.get(f"{os.getenv('PARSER_URL')}/run", params=params, timeout=10)
         if response.status_code in (202, 200):
             await channel.send("Success: parser starting")
+            scheduler.start_run(searches)
             await change_status(is_busy=True)
         else:
             await channel.send(f"Error: received http status {response.status_code}")
@@ -113,34 +126,49 @@ async def change_status(is_busy: bool=False, is_sleep: bool=False):
         activity = None
     await client.change_presence(status=status, activity=activity)
 
-async def send_jobs_message(model: JobResponse):
+async def send_jobs_message(model: JobBatch):
+    if not model.searches:
+        # sent only to finish a run that crawled nothing
+        return
+
     found_job = False
     message = "### Jobs Found\n"
+    if model.profile != "default":
+        message = f"### Jobs Found for {model.profile}\n"
 
-    searches = model.searches
-    for search_term, locations in searches.items():
-        for location, job_postings in locations.items():
-            if len(job_postings.items()) > 0:
-                found_job = True
-            message += f"__\"{search_term}\" in {location}: {len(job_postings.items())} result(s)__\n"
-            if len(job_postings.items()) > 0:
-                for id, job in job_postings.items():
-                    title = job.title
-                    company = job.company
-                    url = job.url
-                    message += f"{company} - {title}: <{url}>\n"
-            else:
-                message += "\n"
-                continue
+    job_postings = model.postings_by_search()
+    for search in model.searches:
+        postings = job_postings[search.ref]
+        if len(postings) > 0:
+            found_job = True
+        message += f"__\"{search.title}\" in {search.location}: {len(postings)} result(s)__\n"
+        if len(postings) > 0:
+            for job in postings:
+                title = truncate(job.title, max_len=42)
+                company = truncate(job.company, max_len=20)
+                url = job.url
+                score = f" ({job.score:.2f})" if job.score is not None else ""
+                message += f"{company} - {title}{score}: <{url}>\n"
+        else:
+            message += "\n"
+            continue
     
+    # each profile can route its jobs to its own channel
+    channel = client.get_channel(model.channel_id or JOBS_CHANNEL_ID)
     try:
         if found_job is True:
-            await client.get_channel(JOBS_CHANNEL_ID).send(message)
+            await channel.send(message)
         else:
-            await client.get_channel(JOBS_CHANNEL_ID).send("No matching jobs found")
+            await channel.send("No matching jobs found")
     except Exception as e:
         print(f"Unable to send jobs message: {str(e)}")
 
+def truncate(str, max_len):
+    if len(str) > max_len:
+        return str[:max_len] + "..."
+    else:
+        return str
+
 async def send_error_message(error: str):
     message = "Received error message:\n"
     message += f"```{error}```"
@@ -173,6 +201,41 @@ async def pong():
     except requests.ConnectionError:
         await channel.send(":red_circle: Parser down")
 
+async def stats(message):
+    msg_split = message.content.split(" ")
+    days = msg_split[1] if len(msg_split) > 1 and msg_split[1].isdigit() else "7"
+    try:
+        runs = requests.get(f"{os.getenv('PARSER_URL')}/stats/runs", params={"days": days}, timeout=10)
+        runs.raise_for_status()
+        stages = requests.get(f"{os.getenv('PARSER_URL')}/stats/stages", params={"days": days}, timeout=10)
+        stages.raise_for_status()
+    except requests.HTTPError as e:
+        await message.channel.send(f"Error: received http status {e.response.status_code}")
+        return
+    except requests.RequestException:
+        await message.channel.send("Error: unable to connect to parser")
+        return
+
+    summary = runs.json()
+    text = f"**Last {days} day(s):** {summary['runs']} run(s), {summary['failed']} failed\n"
+    if summary['runs'] > 0:
+        text += (f"Duration p50 {format_seconds(summary['p50_seconds'])}, p95 {format_seconds(summary['p95_seconds'])}, "
+                 f"{summary['jobs_per_minute'] or 0:.1f} jobs/min\n")
+    for stage in stages.json():
+        text += (f"- {stage['stage']}: {stage['jobs_in']} in, {stage['jobs_out']} out "
+                 f"({(stage['discard_rate'] or 0) * 100:.0f}% discarded), avg {format_seconds(stage['avg_seconds'])}")
+        counters = [f"{stage[key]} {key}" for key in ("pages", "retries", "http_429", "inference_calls") if stage[key]]
+        if counters:
+            text += f", {', '.join(counters)}"
+        text += "\n"
+    await message.channel.send(text)
+
+def format_seconds(seconds: float) -> str:
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
 async def shutdown():
     await client.get_channel(COMMANDS_CHANNEL_ID).send("Sending shutdown signal...")
     try:
@@ -184,48 +247,71 @@ async def shutdown():
 # --- Repeating Task ---
 
 pacific_tz = ZoneInfo('America/Los_Angeles')
-times = [
-    time(hour=0, tzinfo=pacific_tz),
-    time(hour=8, tzinfo=pacific_tz),
-    time(hour=9, tzinfo=pacific_tz),
-    time(hour=10, tzinfo=pacific_tz),
-    time(hour=11, tzinfo=pacific_tz),
-    time(hour=12, tzinfo=pacific_tz),
-    time(hour=13, tzinfo=pacific_tz),
-    time(hour=14, tzinfo=pacific_tz),
-    time(hour=15, tzinfo=pacific_tz),
-    time(hour=16, tzinfo=pacific_tz),
-    time(hour=17, tzinfo=pacific_tz),
-    time(hour=18, tzinfo=pacific_tz),
-    time(hour=19, tzinfo=pacific_tz),
-    time(hour=20, tzinfo=pacific_tz),
-    time(hour=21, tzinfo=pacific_tz),
-    time(hour=22, tzinfo=pacific_tz),
-    time(hour=23, tzinfo=pacific_tz),
-    time(hour=23, tzinfo=pacific_tz),
-]
-
-@tasks.loop(time=times)
+# runs are scheduled between 8:00 and midnight, see scheduler.py
+scheduler = Scheduler(path=os.path.join(os.path.dirname(__file__), "schedule.json"), clock=lambda: datetime.now(pacific_tz), active_hours=(8, 24))
+# new jobs per search of the current run, a run can send one batch per profile
+run_results: dict[str, set[str]] = {}
+# (run_id, batch) of recently received batches, errors use ERROR_BATCH
+received_batches: deque[tuple[str, int]] = deque(maxlen=100)
+ERROR_BATCH = -1
+
+@tasks.loop(minutes=5)
 async def run_parser_task():
-    pacific_time = datetime.now(ZoneInfo('America/Los_Angeles'))
-    if pacific_time.hour == 0:
-        await shutdown()
-        await change_status(is_sleep=True)
-    else:
-        await run_parser()
+    searches = scheduler.due()
+    if searches:
+        await run_parser(searches)
+
+@tasks.loop(time=time(hour=0, tzinfo=pacific_tz))
+async def shutdown_task():
+    await shutdown()
+    await change_status(is_sleep=True)
 
 # --- Fast API ---
 
 @app.post("/receive")
-async def receive_json(model: JobResponse):
+async def receive_json(request: Request) -> BatchAck:
+    try:
+        model = decode(await request.body(), request.headers, JOB_BATCH)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # the parser may send a batch again after a lost acknowledgement
+    key = (model.run_id, model.batch)
+    if key in received_batches:
+        print("Received duplicate batch, ignoring")
+        return BatchAck(run_id=model.run_id, batch=model.batch, received=len(model.postings), duplicate=True)
+    received_batches.append(key)
+
     print("Received data!")
     await send_jobs_message(model)
-    await change_status(is_busy=False)
+    if not scheduler.is_current(model.run_started):
+        # jobs of an earlier run that were delivered late, the current run is still going
+        return BatchAck(run_id=model.run_id, batch=model.batch, received=len(model.postings))
+
+    job_postings = model.postings_by_search()
+    for search in model.searches:
+        ids = run_results.setdefault(search.title, set())
+        ids.update(job.id for job in job_postings[search.ref])
+
+    if model.final:
+        scheduler.finish_run({search_term: len(ids) for search_term, ids in run_results.items()})
+        run_results.clear()
+        await change_status(is_busy=False)
+    return BatchAck(run_id=model.run_id, batch=model.batch, received=len(model.postings))
 
 @app.post("/error")
-async def receive_error(model: ErrorModel):
+async def receive_error(model: ErrorReport):
+    key = (model.run_id, ERROR_BATCH)
+    if model.run_id is not None and key in received_batches:
+        print("Received duplicate error, ignoring")
+        return
+    received_batches.append(key)
+
     print("Received error!")
     await send_error_message(model.error)
+    if scheduler.is_current(model.run_started):
+        scheduler.finish_run(None)
+        run_results.clear()
 
 @app.get("/test")
 async def test_error():
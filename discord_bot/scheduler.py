@@ -0,0 +1,142 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable
+
+ALL_SEARCHES = "*"
+
+MIN_INTERVAL = timedelta(minutes=30)
+DEFAULT_INTERVAL = timedelta(hours=1)
+MAX_INTERVAL = timedelta(hours=6)
+RETRY_INTERVAL = timedelta(minutes=30)
+FULL_RUN_INTERVAL = timedelta(hours=12)    # also picks up searches added to filters.json
+RUN_TIMEOUT = timedelta(hours=2)           # a run without a reply after this is considered dead
+CLOCK_SKEW = timedelta(minutes=5)          # allowed difference between the parser and bot clocks
+HISTORY_SIZE = 3
+
+
+class SearchState:
+    def __init__(self, interval: timedelta = DEFAULT_INTERVAL, next_run: datetime = None, history: list[int] = None):
+        self.interval = interval
+        self.next_run = next_run
+        self.history = history or []
+
+    def to_dict(self) -> dict:
+        return {
+            "interval": self.interval.total_seconds(),
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "history": self.history,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        next_run = datetime.fromisoformat(data["next_run"]) if data.get("next_run") else None
+        return cls(timedelta(seconds=data["interval"]), next_run, data.get("history", []))
+
+    def record(self, new_jobs: int, now: datetime):
+        # busy searches run more often, quiet ones back off
+        self.history = (self.history + [new_jobs])[-HISTORY_SIZE:]
+        if sum(self.history) / len(self.history) >= 1:
+            self.interval = max(MIN_INTERVAL, self.interval / 2)
+        elif new_jobs == 0:
+            self.interval = min(MAX_INTERVAL, self.interval * 1.5)
+        self.next_run = now + self.interval
+
+
+class Scheduler:
+    def __init__(self, path: str = None, clock: Callable[[], datetime] = None, active_hours: tuple[int, int] = (8, 24)):
+        self.path = path
+        self.clock = clock or datetime.now
+        self.active_hours = active_hours
+        self.searches: dict[str, SearchState] = {}
+        self.last_full_run: datetime = None
+        self.running: list[str] = None
+        self.run_started: datetime = None
+        self.retry_after: datetime = None
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        self.searches = {name: SearchState.from_dict(state) for name, state in data.get("searches", {}).items()}
+        if data.get("last_full_run"):
+            self.last_full_run = datetime.fromisoformat(data["last_full_run"])
+        self.running = data.get("running")
+        if data.get("run_started"):
+            self.run_started = datetime.fromisoformat(data["run_started"])
+        if data.get("retry_after"):
+            self.retry_after = datetime.fromisoformat(data["retry_after"])
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "searches": {name: state.to_dict() for name, state in self.searches.items()},
+            "last_full_run": self.last_full_run.isoformat() if self.last_full_run else None,
+            "running": self.running,
+            "run_started": self.run_started.isoformat() if self.run_started else None,
+            "retry_after": self.retry_after.isoformat() if self.retry_after else None,
+        }
+        # write to a temporary file first so a crash never leaves a half written state file
+        temp_file = os.path.join(os.path.dirname(os.path.abspath(self.path)), str(uuid.uuid4()))
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_file, self.path)
+
+    def is_running(self) -> bool:
+        if self.running is None:
+            return False
+        if self.clock() - self.run_started > RUN_TIMEOUT:
+            # no reply from the parser, let the next run go ahead
+            self.finish_run(None)
+            return False
+        return True
+
+    def is_active(self) -> bool:
+        start, end = self.active_hours
+        return start <= self.clock().hour < end
+
+    def due(self) -> list[str]:
+        # searches that should run now, deferred while a run is in progress
+        if self.is_running() or not self.is_active():
+            return []
+        now = self.clock()
+        if self.retry_after is not None and now < self.retry_after:
+            return []
+        if not self.searches or self.last_full_run is None or now - self.last_full_run >= FULL_RUN_INTERVAL:
+            return [ALL_SEARCHES]
+        return sorted(name for name, state in self.searches.items() if state.next_run is None or state.next_run <= now)
+
+    def is_current(self, started: datetime | None) -> bool:
+        # False for a reply from an earlier run that was delivered late
+        if self.running is None:
+            return False
+        if started is None:
+            return True
+        if self.run_started.tzinfo is None and started.tzinfo is not None:
+            started = started.astimezone().replace(tzinfo=None)
+        return started >= self.run_started - CLOCK_SKEW
+
+    def start_run(self, searches: list[str]):
+        self.running = searches
+        self.run_started = self.clock()
+        self.save()
+
+    def finish_run(self, new_jobs: dict[str, int] | None):
+        # new_jobs is the number of new jobs per search, None if the run failed
+        now = self.clock()
+        running = self.running or []
+        if new_jobs is None:
+            self.retry_after = now + RETRY_INTERVAL
+        else:
+            self.retry_after = None
+            if ALL_SEARCHES in running:
+                self.last_full_run = now
+            for name, count in new_jobs.items():
+                self.searches.setdefault(name, SearchState()).record(count, now)
+        self.running = None
+        self.run_started = None
+        self.save()
@@ -0,0 +1,3 @@
+from .models import (BATCH_ACK, JOB_BATCH, SCHEMA_VERSION, BatchAck,
+                     ErrorReport, JobBatch, Posting, Search)
+from .wire import GZIP, JSON, MSGPACK, decode, encode, has_msgpack
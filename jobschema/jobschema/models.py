@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+# bumped on any change the other side can't read, both machines must run the same version
+SCHEMA_VERSION = 1
+
+
+class Search(BaseModel):
+    ref: int
+    title: str
+    location: str
+
+class Posting(BaseModel):
+    id: str
+    search: int     # Search.ref
+    title: str
+    company: str
+    url: str
+    score: Optional[float] = None   # relevance to the batch's profile, 0 to 1
+
+class JobBatch(BaseModel):
+    version: int = SCHEMA_VERSION
+    run_id: str     # idempotency key, the same (run_id, batch) is only handled once
+    run_started: Optional[datetime] = None  # batches can be delivered long after their run
+    batch: int = 0
+    final: bool = True
+    profile: str = "default"
+    channel_id: Optional[int] = None
+    searches: List[Search] = []
+    postings: List[Posting] = []
+
+    def add_search(self, title: str, location: str) -> int:
+        for search in self.searches:
+            if search.title == title and search.location == location:
+                return search.ref
+        self.searches.append(Search(ref=len(self.searches), title=title, location=location))
+        return len(self.searches) - 1
+
+    def postings_by_search(self) -> dict[int, list[Posting]]:
+        grouped = {search.ref: [] for search in self.searches}
+        for posting in self.postings:
+            grouped.setdefault(posting.search, []).append(posting)
+        return grouped
+
+class BatchAck(BaseModel):
+    run_id: str
+    batch: int
+    received: int
+    duplicate: bool = False
+
+class ErrorReport(BaseModel):
+    error: str
+    run_id: Optional[str] = None
+    run_started: Optional[datetime] = None
+
+
+# validators are built once, validate_json parses and validates in one pass
+JOB_BATCH = TypeAdapter(JobBatch)
+BATCH_ACK = TypeAdapter(BatchAck)
@@ -0,0 +1,45 @@
+import gzip
+
+from pydantic import BaseModel, TypeAdapter
+
+from .models import SCHEMA_VERSION
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+GZIP = "gzip"
+
+
+def has_msgpack() -> bool:
+    try:
+        import msgpack
+    except ImportError:
+        return False
+    return True
+
+
+def encode(model: BaseModel, content_type: str = JSON, compress: bool = True) -> tuple[bytes, dict]:
+    # returns the request body and its headers
+    if content_type == MSGPACK:
+        import msgpack
+        body = msgpack.packb(model.model_dump(mode="json"))
+    else:
+        body = model.model_dump_json().encode()
+    headers = {"Content-Type": content_type}
+    if compress:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = GZIP
+    return body, headers
+
+
+def decode(body: bytes, headers, adapter: TypeAdapter):
+    if headers.get("Content-Encoding", "").lower() == GZIP:
+        body = gzip.decompress(body)
+    if headers.get("Content-Type", JSON).split(";")[0].strip() == MSGPACK:
+        import msgpack
+        model = adapter.validate_python(msgpack.unpackb(body))
+    else:
+        model = adapter.validate_json(body)
+    version = getattr(model, "version", SCHEMA_VERSION)
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported schema version {version}, expected {SCHEMA_VERSION}")
+    return model
@@ -1,48 +1,120 @@
 import json
 import sqlite3
-from datetime import date, datetime, timedelta
+import threading
+import time
+import uuid
+from datetime import datetime
 
 import pytz
 
+import fingerprint
 from Job import Job
 from JobDB import JobDB
 
 DB_PATH = "db/jobs.db"
 DAYS_CACHED = 29
+SECONDS_PER_DAY = 86400
+BUSY_TIMEOUT = 30          # seconds a writer waits for another connection's write to finish
+CACHED_STATEMENTS = 256    # prepared statements kept per connection, every query here is a constant string
+
+# discarded is a boolean value (0/1), expiration is a unix epoch, search is the title it was found under
+LINKEDIN_TABLE = '''
+    CREATE TABLE IF NOT EXISTS linkedin (
+        id INTEGER NOT NULL PRIMARY KEY,
+        title TEXT DEFAULT '',
+        company TEXT DEFAULT '',
+        location TEXT DEFAULT '',
+        description TEXT DEFAULT '',
+        keywords TEXT DEFAULT '',
+        stage TEXT DEFAULT '',
+        discarded INTEGER DEFAULT 0,
+        expiration INTEGER DEFAULT 0,
+        search TEXT DEFAULT ''
+    )
+'''
+
+# content fingerprint of each judged job, see fingerprint.py
+FINGERPRINT_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS fingerprint (
+        id INTEGER NOT NULL PRIMARY KEY,
+        simhash INTEGER NOT NULL,
+        {", ".join(f"band{band} INTEGER NOT NULL" for band in range(fingerprint.BANDS))}
+    )
+'''
+
+# a live outbox message (aliased o) with no earlier live message of the same run, messages without a run are one group
+OUTBOX_HEAD = '''
+    o.dead = 0
+    AND NOT EXISTS (
+        SELECT 1 FROM outbox AS earlier
+        WHERE earlier.dead = 0
+        AND earlier.run_id IS o.run_id
+        AND earlier.id < o.id
+    )
+'''
 
 class Database:
-    init_run: bool = True
+    # database files whose tables were created by this process
+    initialized: set[str] = set()
+    init_lock = threading.Lock()
 
     def __init__(self, db_file = None):
-        if db_file:
-            self.connection = sqlite3.connect(db_file)
-        else:
-            self.connection = sqlite3.connect(DB_PATH)
-        self.cursor = self.connection.cursor()
-        
-        if Database.init_run is True:
-            self.create_table()
-            Database.init_run = False
+        # each thread gets its own connection and cursor, created on first use, so one
+        # Database can be shared by the API server, parser and maintenance threads.
+        # in WAL mode readers never block and writers take turns within BUSY_TIMEOUT
+        self.path = db_file or DB_PATH
+        if self.path == ":memory:":
+            # a named shared cache lets every thread see the same in-memory database
+            self.path = f"file:{uuid.uuid4()}?mode=memory&cache=shared"
+        self.local = threading.local()
+        self.connections: list[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+        with Database.init_lock:
+            if self.path not in Database.initialized:
+                self.create_table()
+                self.connection.commit()
+                Database.initialized.add(self.path)
+
+    def __enter__(self):
+        return self
 
-        day = date.today().day
-        if day in (15, 28):
-            self.delete_expired()
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_connection()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.connect()
+            self.local.connection = connection
+            self.local.cursor = connection.cursor()
+        return connection
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        self.connection     # opens this thread's connection and cursor if needed
+        return self.local.cursor
+
+    def connect(self) -> sqlite3.Connection:
+        with self.lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS,
+                                         check_same_thread=False, uri=self.path.startswith("file:"))
+            self.connections.append(connection)
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
 
     def create_table(self):
-        # discarded is a boolean value (0/1)
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS linkedin (
-                id INTEGER NOT NULL PRIMARY KEY,
-                title TEXT DEFAULT '',
-                company TEXT DEFAULT '',
-                location TEXT DEFAULT '',
-                description TEXT DEFAULT '',
-                keywords TEXT DEFAULT '',
-                stage TEXT DEFAULT '',
-                discarded INTEGER DEFAULT 0,
-                expiration TEXT DEFAULT ''
-            )
-        ''')
+        # only applies to new databases, existing ones switch on the next VACUUM
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # readers keep working while a write is in progress, stored in the database file
+        self.cursor.execute("PRAGMA journal_mode = WAL").fetchall()
+        self.cursor.execute(LINKEDIN_TABLE)
+        self.migrate_expiration()
+        self.migrate_search()
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS parameters (
                 last_run TEXT DEFAULT ''
@@ -53,17 +125,220 @@ class Database:
             SELECT ''
             WHERE NOT EXISTS (SELECT 1 FROM parameters)
         ''')
+        # history of each parser run and of each stage per search, see runstats.py
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER NOT NULL PRIMARY KEY,
+                started REAL NOT NULL,
+                ended REAL,
+                status TEXT DEFAULT 'running',
+                searches TEXT DEFAULT ''
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS run_stages (
+                run_id INTEGER NOT NULL,
+                search TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                started REAL NOT NULL,
+                ended REAL,
+                jobs_in INTEGER DEFAULT 0,
+                jobs_out INTEGER DEFAULT 0,
+                pages INTEGER DEFAULT 0,
+                retries INTEGER DEFAULT 0,
+                http_429 INTEGER DEFAULT 0,
+                inference_calls INTEGER DEFAULT 0,
+                PRIMARY KEY (run_id, search, stage)
+            )
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started)")
+        # messages waiting for the bot to acknowledge them and the jobs each one carries, see outbox.py
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                run_id TEXT,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                next_attempt REAL DEFAULT 0,
+                last_error TEXT,
+                dead INTEGER DEFAULT 0
+            )
+        ''')
+        self.migrate_outbox()
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_job (
+                outbox_id INTEGER NOT NULL,
+                job_id INTEGER NOT NULL,
+                PRIMARY KEY (outbox_id, job_id)
+            )
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_job_id ON outbox_job (job_id)")
+        # last parsed page and job id of an unfinished search
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resume_cursor (
+                search TEXT NOT NULL,
+                location TEXT NOT NULL,
+                page INTEGER DEFAULT 0,
+                last_id INTEGER,
+                PRIMARY KEY (search, location)
+            )
+        ''')
+        self.cursor.execute(FINGERPRINT_TABLE)
+        self.migrate_fingerprint()
+        for band in range(fingerprint.BANDS):
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_fingerprint_band{band} ON fingerprint (band{band})")
+        # keyword and qualification verdicts of each profile, see profiles.py
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS profile_match (
+                id INTEGER NOT NULL,
+                profile TEXT NOT NULL,
+                keyword_match INTEGER DEFAULT 0,
+                keywords TEXT DEFAULT '',
+                qualified INTEGER,
+                score REAL,
+                PRIMARY KEY (id, profile)
+            )
+        ''')
+        self.migrate_profile_match()
+        # persisted tf-idf vocabulary and scored jobs, see scoring.py
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tfidf_term (
+                term TEXT NOT NULL PRIMARY KEY,
+                df INTEGER DEFAULT 0
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tfidf_doc (
+                id INTEGER NOT NULL PRIMARY KEY,
+                score REAL
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_linkedin_stage
+            ON linkedin (stage, discarded)
+        ''')
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_linkedin_expiration
+            ON linkedin (expiration)
+        ''')
+        self.create_search_index()
         self.connection.commit()
 
+    def create_search_index(self):
+        # full text index over linkedin, kept up to date by triggers instead of rebuilt per query
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'linkedin_fts'")
+        exists = self.cursor.fetchone() is not None
+        self.cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS linkedin_fts
+            USING fts5(title, company, description, content='linkedin', content_rowid='id')
+        ''')
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS linkedin_fts_insert AFTER INSERT ON linkedin BEGIN
+                INSERT INTO linkedin_fts (rowid, title, company, description)
+                VALUES (new.id, new.title, new.company, new.description);
+            END
+        ''')
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS linkedin_fts_delete AFTER DELETE ON linkedin BEGIN
+                INSERT INTO linkedin_fts (linkedin_fts, rowid, title, company, description)
+                VALUES ('delete', old.id, old.title, old.company, old.description);
+            END
+        ''')
+        # stage and discard updates don't touch the index
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS linkedin_fts_update AFTER UPDATE OF title, company, description ON linkedin BEGIN
+                INSERT INTO linkedin_fts (linkedin_fts, rowid, title, company, description)
+                VALUES ('delete', old.id, old.title, old.company, old.description);
+                INSERT INTO linkedin_fts (rowid, title, company, description)
+                VALUES (new.id, new.title, new.company, new.description);
+            END
+        ''')
+        if not exists:
+            # index the jobs stored before the index existed
+            self.cursor.execute("INSERT INTO linkedin_fts (linkedin_fts) VALUES ('rebuild')")
+
+    def migrate_expiration(self):
+        # expiration used to be stored as a 'YYYY-MM-DD' string
+        self.cursor.execute('''
+            SELECT type FROM pragma_table_info('linkedin')
+            WHERE name = 'expiration'
+        ''')
+        if self.cursor.fetchone()[0] == 'INTEGER':
+            return
+
+        self.cursor.execute("ALTER TABLE linkedin RENAME TO linkedin_old")
+        self.cursor.execute(LINKEDIN_TABLE)
+        self.cursor.execute('''
+            INSERT INTO linkedin (id, title, company, location, description, keywords, stage, discarded, expiration)
+            SELECT id, title, company, location, description, keywords, stage, discarded,
+                COALESCE(CAST(strftime('%s', NULLIF(expiration, '')) AS INTEGER), 0)
+            FROM linkedin_old
+        ''')
+        self.cursor.execute("DROP TABLE linkedin_old")
+        self.connection.commit()
+
+    def migrate_search(self):
+        self.cursor.execute('''
+            SELECT 1 FROM pragma_table_info('linkedin')
+            WHERE name = 'search'
+        ''')
+        if self.cursor.fetchone() is None:
+            self.cursor.execute("ALTER TABLE linkedin ADD COLUMN search TEXT DEFAULT ''")
+            self.connection.commit()
+
+    def migrate_profile_match(self):
+        # jobs used to be scored once for all profiles
+        self.cursor.execute('''
+            SELECT 1 FROM pragma_table_info('profile_match')
+            WHERE name = 'score'
+        ''')
+        if self.cursor.fetchone() is None:
+            self.cursor.execute("ALTER TABLE profile_match ADD COLUMN score REAL")
+            self.connection.commit()
+
+    def migrate_fingerprint(self):
+        # fingerprints used to carry a repost key of title, company and location
+        self.cursor.execute('''
+            SELECT 1 FROM pragma_table_info('fingerprint')
+            WHERE name = 'repost_key'
+        ''')
+        if self.cursor.fetchone() is None:
+            return
+
+        band_columns = ", ".join(f"band{band}" for band in range(fingerprint.BANDS))
+        self.cursor.execute("DROP INDEX IF EXISTS idx_fingerprint_key")
+        self.cursor.execute("ALTER TABLE fingerprint RENAME TO fingerprint_old")
+        self.cursor.execute(FINGERPRINT_TABLE)
+        self.cursor.execute(f'''
+            INSERT INTO fingerprint (id, simhash, {band_columns})
+            SELECT id, simhash, {band_columns}
+            FROM fingerprint_old
+        ''')
+        self.cursor.execute("DROP TABLE fingerprint_old")
+        self.connection.commit()
+
+    def migrate_outbox(self):
+        # messages used to be sent strictly in order with no dead-letter state
+        self.cursor.execute('''
+            SELECT 1 FROM pragma_table_info('outbox')
+            WHERE name = 'dead'
+        ''')
+        if self.cursor.fetchone() is None:
+            self.cursor.execute("ALTER TABLE outbox ADD COLUMN run_id TEXT")
+            self.cursor.execute("ALTER TABLE outbox ADD COLUMN dead INTEGER DEFAULT 0")
+            self.connection.commit()
+
     def create(self, job: JobDB):
-        best_by = date.today() + timedelta(days=DAYS_CACHED)
+        best_by = int(time.time()) + DAYS_CACHED * SECONDS_PER_DAY
         info = job.info
         self.cursor.execute('''
             INSERT INTO linkedin 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (info.id, info.title, info.company, \
             info.location, info.description, None, \
-                job.stage, job.discarded, best_by,))
+                job.stage, job.discarded, best_by, job.search,))
         self.connection.commit()
         return self.cursor.lastrowid
 
@@ -109,19 +384,50 @@ class Database:
         ''', (id,))
         self.connection.commit()
     
-    def delete_expired(self):
+    def delete_expired(self, limit: int = -1) -> int:
+        # delete at most limit rows so the write lock is only held briefly
         self.cursor.execute('''
             DELETE FROM linkedin
-            WHERE expiration < ?
-        ''', (date.today(),))
+            WHERE id IN (
+                SELECT id FROM linkedin
+                WHERE expiration < ?
+                LIMIT ?
+            )
+        ''', (int(time.time()), limit,))
+        deleted = self.cursor.rowcount
+        self.cursor.execute('''
+            DELETE FROM fingerprint
+            WHERE id NOT IN (SELECT id FROM linkedin)
+        ''')
+        self.cursor.execute('''
+            DELETE FROM profile_match
+            WHERE id NOT IN (SELECT id FROM linkedin)
+        ''')
+        self.cursor.execute('''
+            DELETE FROM tfidf_doc
+            WHERE id NOT IN (SELECT id FROM linkedin)
+        ''')
         self.connection.commit()
+        return deleted
     
-    def get_all_stage(self, stage, discarded) -> list[JobDB]:
+    def get_all_stage(self, stage, discarded, search: str = None) -> list[JobDB]:
+        if search is not None:
+            # jobs stored before searches were recorded are adopted by the first search resuming them
+            self.cursor.execute('''
+                UPDATE linkedin
+                SET search = ?
+                WHERE stage = ?
+                AND discarded = ?
+                AND search = ''
+            ''', (search, stage, discarded,))
+            self.connection.commit()
         self.cursor.execute('''
             SELECT * FROM linkedin
             WHERE stage = ?
             AND discarded = ?
-        ''', (stage, discarded,))
+            AND (? IS NULL OR search = ?)
+            ORDER BY id
+        ''', (stage, discarded, search, search,))
         fetch_list = self.cursor.fetchall()
         jobs_list = []
         for entry in fetch_list:
@@ -133,14 +439,321 @@ class Database:
                     location=entry[3],
                     description=entry[4],
                     matching_keywords=json.loads(entry[5] or '{}')
-                ), stage=entry[6], discarded=entry[7])
+                ), stage=entry[6], discarded=entry[7], search=entry[9])
             )
         return jobs_list
 
 
+    def get_jobs(self, after_id: int = 0, limit: int = 100, stage: str = None, search: str = None,
+            company: str = None, keyword: str = None, since: float = None, until: float = None,
+            discarded: bool = None, text: str = None, description: bool = False) -> list[dict]:
+        # keyset pagination, the next page starts after the last id of this one
+        conditions = ["l.id > ?"]
+        params = [after_id]
+        if stage is not None:
+            conditions.append("l.stage = ?")
+            params.append(stage)
+        if search is not None:
+            conditions.append("l.search = ?")
+            params.append(search)
+        if company is not None:
+            conditions.append("l.company = ? COLLATE NOCASE")
+            params.append(company)
+        if keyword is not None:
+            # keywords is a json list, or 'ERROR' for jobs that failed to load
+            conditions.append('''EXISTS (
+                SELECT 1 FROM json_each(CASE WHEN json_valid(l.keywords) THEN l.keywords ELSE '[]' END)
+                WHERE value = ? COLLATE NOCASE
+            )''')
+            params.append(keyword)
+        # jobs are first seen DAYS_CACHED days before they expire
+        if since is not None:
+            conditions.append("l.expiration >= ?")
+            params.append(int(since) + DAYS_CACHED * SECONDS_PER_DAY)
+        if until is not None:
+            conditions.append("l.expiration < ?")
+            params.append(int(until) + DAYS_CACHED * SECONDS_PER_DAY)
+        if discarded is not None:
+            conditions.append("l.discarded = ?")
+            params.append(discarded)
+        if text is not None:
+            conditions.append("l.id IN (SELECT rowid FROM linkedin_fts WHERE linkedin_fts MATCH ?)")
+            params.append(text)
+
+        self.cursor.execute(f'''
+            SELECT l.id, l.title, l.company, l.location, l.search, l.stage, l.discarded, l.keywords,
+                l.expiration - {DAYS_CACHED * SECONDS_PER_DAY}, {"l.description" if description else "NULL"}, t.score
+            FROM linkedin l
+            LEFT JOIN tfidf_doc t ON t.id = l.id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY l.id
+            LIMIT ?
+        ''', (*params, limit,))
+        jobs = []
+        for row in self.cursor.fetchall():
+            keywords = json.loads(row[7]) if row[7] and row[7].startswith('[') else []
+            job = {
+                "id": row[0],
+                "title": row[1],
+                "company": row[2],
+                "location": row[3],
+                "search": row[4],
+                "stage": row[5],
+                "discarded": bool(row[6]),
+                "keywords": keywords,
+                "first_seen": datetime.fromtimestamp(row[8], pytz.utc).isoformat() if row[8] > 0 else None,
+                "url": Job(row[0], row[1], row[2], row[3]).get_url(),
+                # best relevance score of any profile, None until the job was ranked
+                "score": row[10],
+            }
+            if description:
+                job["description"] = row[9]
+            jobs.append(job)
+        return jobs
+
+    def iter_jobs(self, batch_size: int = 500, **filters):
+        # every matching job one page at a time, the whole result is never held in memory
+        after_id = filters.pop("after_id", 0)
+        while True:
+            jobs = self.get_jobs(after_id=after_id, limit=batch_size, **filters)
+            yield from jobs
+            if len(jobs) < batch_size:
+                return
+            after_id = jobs[-1]["id"]
+
+    def get_company_discards(self, min_jobs: int) -> list[tuple[str, int, int]]:
+        # (company, judged jobs, discarded jobs) for jobs that reached a keyword or qualification verdict,
+        # jobs whose page failed to load are not a verdict on the company
+        self.cursor.execute('''
+            SELECT company, COUNT(*), SUM(discarded)
+            FROM linkedin
+            WHERE ((stage = 'keyword' AND discarded = 1) OR stage IN ('qualification', 'prep_send', 'completed'))
+            AND keywords IS NOT 'ERROR'
+            AND company != ''
+            GROUP BY company
+            HAVING COUNT(*) >= ?
+        ''', (min_jobs,))
+        return self.cursor.fetchall()
+
+    def get_title_discards(self) -> list[tuple[str, int]]:
+        # (title, discarded) for the same jobs as get_company_discards
+        self.cursor.execute('''
+            SELECT title, discarded
+            FROM linkedin
+            WHERE ((stage = 'keyword' AND discarded = 1) OR stage IN ('qualification', 'prep_send', 'completed'))
+            AND keywords IS NOT 'ERROR'
+        ''')
+        return self.cursor.fetchall()
+
     def id_exists(self, id: int) -> bool:
         return self.read(id) is not None
     
+    def create_run(self, started: float, searches: list[str]) -> int:
+        self.cursor.execute('''
+            INSERT INTO runs (started, searches)
+            VALUES (?, ?)
+        ''', (started, json.dumps(searches),))
+        self.connection.commit()
+        return self.cursor.lastrowid
+
+    def finish_run(self, run_id: int, ended: float, status: str):
+        self.cursor.execute('''
+            UPDATE runs
+            SET ended = ?, status = ?
+            WHERE id = ?
+        ''', (ended, status, run_id,))
+        self.connection.commit()
+
+    def save_run_stage(self, run_id: int, search: str, stage: str, started: float, ended: float, jobs_in: int,
+            jobs_out: int, pages: int, retries: int, http_429: int, inference_calls: int):
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO run_stages
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (run_id, search, stage, started, ended, jobs_in, jobs_out, pages, retries, http_429, inference_calls,))
+        self.connection.commit()
+
+    def get_run_summary(self, since: float) -> dict:
+        # p50/p95 duration and throughput of completed runs, nearest-rank percentiles:
+        # the shortest duration at least that share of runs is no longer than
+        self.cursor.execute('''
+            WITH run_jobs AS (
+                SELECT r.id, r.ended - r.started AS duration, COALESCE(SUM(s.jobs_in), 0) AS jobs
+                FROM runs r
+                LEFT JOIN run_stages s ON s.run_id = r.id AND s.stage = 'parse'
+                WHERE r.status = 'completed'
+                AND r.started >= ?
+                GROUP BY r.id
+            ),
+            ranked AS (
+                SELECT duration, jobs,
+                    CUME_DIST() OVER (ORDER BY duration) AS pct
+                FROM run_jobs
+            )
+            SELECT
+                COUNT(*),
+                MIN(CASE WHEN pct >= 0.5 THEN duration END),
+                MIN(CASE WHEN pct >= 0.95 THEN duration END),
+                SUM(jobs) * 60.0 / NULLIF(SUM(duration), 0)
+            FROM ranked
+        ''', (since,))
+        runs, p50, p95, jobs_per_minute = self.cursor.fetchone()
+        self.cursor.execute('''
+            SELECT COUNT(*) FROM runs
+            WHERE status = 'failed'
+            AND started >= ?
+        ''', (since,))
+        return {
+            "runs": runs,
+            "failed": self.cursor.fetchone()[0],
+            "p50_seconds": p50,
+            "p95_seconds": p95,
+            "jobs_per_minute": jobs_per_minute,
+        }
+
+    def get_run_trend(self, since: float, window: int = 7) -> list[dict]:
+        # daily duration and throughput with a moving average over the last window days
+        self.cursor.execute('''
+            WITH run_jobs AS (
+                SELECT date(r.started, 'unixepoch', 'localtime') AS day,
+                    r.ended - r.started AS duration,
+                    COALESCE(SUM(s.jobs_in), 0) AS jobs
+                FROM runs r
+                LEFT JOIN run_stages s ON s.run_id = r.id AND s.stage = 'parse'
+                WHERE r.status = 'completed'
+                AND r.started >= ?
+                GROUP BY r.id
+            ),
+            daily AS (
+                SELECT day, COUNT(*) AS runs, AVG(duration) AS avg_duration,
+                    SUM(jobs) AS jobs, SUM(duration) AS total_duration
+                FROM run_jobs
+                GROUP BY day
+            )
+            SELECT day, runs, avg_duration,
+                jobs * 60.0 / NULLIF(total_duration, 0),
+                AVG(avg_duration) OVER w,
+                SUM(jobs) OVER w * 60.0 / NULLIF(SUM(total_duration) OVER w, 0)
+            FROM daily
+            WINDOW w AS (ORDER BY day ROWS BETWEEN ? PRECEDING AND CURRENT ROW)
+            ORDER BY day
+        ''', (since, window - 1,))
+        return [
+            {
+                "day": row[0],
+                "runs": row[1],
+                "avg_seconds": row[2],
+                "jobs_per_minute": row[3],
+                "avg_seconds_moving": row[4],
+                "jobs_per_minute_moving": row[5],
+            }
+            for row in self.cursor.fetchall()
+        ]
+
+    def get_stage_summary(self, since: float) -> list[dict]:
+        self.cursor.execute('''
+            SELECT s.stage,
+                SUM(s.jobs_in),
+                SUM(s.jobs_out),
+                MAX(0.0, 1.0 - SUM(s.jobs_out) * 1.0 / NULLIF(SUM(s.jobs_in), 0)),
+                AVG(s.ended - s.started),
+                SUM(s.pages),
+                SUM(s.retries),
+                SUM(s.http_429),
+                SUM(s.inference_calls)
+            FROM run_stages s
+            JOIN runs r ON r.id = s.run_id
+            WHERE r.started >= ?
+            GROUP BY s.stage
+            ORDER BY MIN(s.started)
+        ''', (since,))
+        keys = ("stage", "jobs_in", "jobs_out", "discard_rate", "avg_seconds", "pages", "retries", "http_429", "inference_calls")
+        return [dict(zip(keys, row)) for row in self.cursor.fetchall()]
+
+    def enqueue_outbox(self, messages: list[tuple[str, str, str, list[int]]], job_ids: list[int] = (),
+            pending_stage: str = None, done_stage: str = None):
+        # (kind, run id, payload, job ids) messages are stored in the same transaction as the stage change of job_ids:
+        # jobs carried by a message wait in pending_stage until it is acknowledged, the rest are done
+        try:
+            for kind, run_id, payload, message_job_ids in messages:
+                self.cursor.execute('''
+                    INSERT INTO outbox (kind, run_id, payload, created)
+                    VALUES (?, ?, ?, ?)
+                ''', (kind, run_id, payload, time.time(),))
+                outbox_id = self.cursor.lastrowid
+                self.cursor.executemany('''
+                    INSERT OR IGNORE INTO outbox_job (outbox_id, job_id)
+                    VALUES (?, ?)
+                ''', [(outbox_id, int(id)) for id in message_job_ids])
+            self.cursor.executemany('''
+                UPDATE linkedin
+                SET stage = CASE WHEN EXISTS (SELECT 1 FROM outbox_job WHERE job_id = linkedin.id) THEN ? ELSE ? END
+                WHERE id = ?
+            ''', [(pending_stage, done_stage, int(id)) for id in job_ids])
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def claim_outbox(self, now: float, lease: float):
+        # the oldest due message that is first in its run, a run's messages are sent in order so the bot
+        # sees its final batch last, other runs aren't held up by it.
+        # a claimed message is hidden from other senders for lease seconds while it is sent
+        self.cursor.execute(f'''
+            UPDATE outbox
+            SET next_attempt = ?
+            WHERE id = (
+                SELECT id FROM outbox AS o
+                WHERE {OUTBOX_HEAD}
+                AND next_attempt <= ?
+                ORDER BY id
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts
+        ''', (now + lease, now,))
+        row = self.cursor.fetchone()
+        self.connection.commit()
+        return row
+
+    def ack_outbox(self, outbox_id: int, done_stage: str):
+        # jobs are done once no other message carries them
+        self.cursor.execute("SELECT job_id FROM outbox_job WHERE outbox_id = ?", (outbox_id,))
+        job_ids = [row[0] for row in self.cursor.fetchall()]
+        self.cursor.execute("DELETE FROM outbox_job WHERE outbox_id = ?", (outbox_id,))
+        self.cursor.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+        self.cursor.executemany('''
+            UPDATE linkedin
+            SET stage = ?
+            WHERE id = ?
+            AND NOT EXISTS (SELECT 1 FROM outbox_job WHERE job_id = linkedin.id)
+        ''', [(done_stage, id) for id in job_ids])
+        self.connection.commit()
+
+    def fail_outbox(self, outbox_id: int, next_attempt: float, error: str):
+        self.cursor.execute('''
+            UPDATE outbox
+            SET attempts = attempts + 1, next_attempt = ?, last_error = ?
+            WHERE id = ?
+        ''', (next_attempt, error, outbox_id,))
+        self.connection.commit()
+
+    def kill_outbox(self, outbox_id: int, error: str):
+        # dead letter, kept for inspection but never sent again, its jobs stay in their pending stage
+        self.cursor.execute('''
+            UPDATE outbox
+            SET attempts = attempts + 1, last_error = ?, dead = 1
+            WHERE id = ?
+        ''', (error, outbox_id,))
+        self.connection.commit()
+
+    def get_outbox_pending(self) -> tuple[int, float | None]:
+        # number of live messages waiting and when the first one that can be sent is due
+        self.cursor.execute(f'''
+            SELECT COUNT(*), MIN(CASE WHEN {OUTBOX_HEAD} THEN next_attempt END)
+            FROM outbox AS o
+            WHERE dead = 0
+        ''')
+        return self.cursor.fetchone()
+
     def get_last_run(self):
         self.cursor.execute("SELECT last_run FROM parameters LIMIT 1")
         last_run = self.cursor.fetchone()
@@ -156,8 +769,181 @@ class Database:
         ''', (now, 1,))
         self.connection.commit()
     
-    def close_connection(self):
-        self.connection.close()
+    def create_fingerprint(self, id: int, simhash: int):
+        placeholders = ", ".join("?" * (2 + fingerprint.BANDS))
+        self.cursor.execute(f'''
+            INSERT OR REPLACE INTO fingerprint
+            VALUES ({placeholders})
+        ''', (id, fingerprint.to_signed(simhash), *fingerprint.bands(simhash),))
+        self.connection.commit()
+
+    def find_similar(self, id: int, simhash: int, search: str):
+        # candidates share at least one band, exact distance is checked by the caller.
+        # years of experience differ per search, only jobs judged under the same search are candidates
+        band_match = " OR ".join(f"f.band{band} = ?" for band in range(fingerprint.BANDS))
+        self.cursor.execute(f'''
+            SELECT l.id, f.simhash, l.stage, l.discarded, l.keywords
+            FROM fingerprint f
+            JOIN linkedin l ON l.id = f.id
+            WHERE ({band_match})
+            AND f.id != ?
+            AND l.search = ?
+            ORDER BY l.id DESC
+        ''', (*fingerprint.bands(simhash), id, search,))
+        return [(row[0], fingerprint.to_unsigned(row[1]), *row[2:]) for row in self.cursor.fetchall()]
+
+    def update_profile_match(self, id: int, profile: str, keyword_match: bool = None,
+            keywords: str = None, qualified: bool = None):
+        self.cursor.execute('''
+            INSERT OR IGNORE INTO profile_match (id, profile)
+            VALUES (?, ?)
+        ''', (id, profile,))
+        self.cursor.execute('''
+            UPDATE profile_match
+            SET keyword_match = COALESCE(?, keyword_match),
+                keywords = COALESCE(?, keywords),
+                qualified = COALESCE(?, qualified)
+            WHERE id = ?
+            AND profile = ?
+        ''', (keyword_match, keywords, qualified, id, profile,))
+        self.connection.commit()
+
+    def get_profile_matches(self, id: int) -> dict[str, tuple[bool, list[str], bool | None]]:
+        # profile -> (keyword match, matched keywords, qualified)
+        self.cursor.execute('''
+            SELECT profile, keyword_match, keywords, qualified FROM profile_match
+            WHERE id = ?
+        ''', (id,))
+        return {
+            row[0]: (bool(row[1]), json.loads(row[2] or '[]'), None if row[3] is None else bool(row[3]))
+            for row in self.cursor.fetchall()
+        }
+
+    def update_profile_scores(self, scores: list[tuple[float, int, str]]):
+        # (score, id, profile), only jobs that already have a verdict for the profile are scored
+        self.cursor.executemany('''
+            UPDATE profile_match
+            SET score = ?
+            WHERE id = ?
+            AND profile = ?
+        ''', scores)
+        self.connection.commit()
+
+    def get_tfidf_index(self) -> tuple[list[str], list[int], int]:
+        self.cursor.execute("SELECT term, df FROM tfidf_term ORDER BY rowid")
+        rows = self.cursor.fetchall()
+        self.cursor.execute("SELECT COUNT(*) FROM tfidf_doc")
+        n_docs = self.cursor.fetchone()[0]
+        return [row[0] for row in rows], [row[1] for row in rows], n_docs
+
+    def update_tfidf_index(self, df_updates: list[tuple[str, int]], doc_ids: list[int], scores: list[float]):
+        self.cursor.executemany('''
+            INSERT INTO tfidf_term (term, df)
+            VALUES (?, ?)
+            ON CONFLICT (term)
+            DO UPDATE SET df = df + excluded.df
+        ''', df_updates)
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO tfidf_doc (id, score)
+            VALUES (?, ?)
+        ''', zip(doc_ids, scores))
+        self.connection.commit()
+
+    def get_indexed_descriptions(self) -> list[str]:
+        self.cursor.execute('''
+            SELECT l.description FROM tfidf_doc d
+            JOIN linkedin l ON l.id = d.id
+            WHERE l.description != ''
+        ''')
+        return [row[0] for row in self.cursor.fetchall()]
 
-db = Database()
-db.get_all_stage("parse", False)
\ No newline at end of file
+    def replace_tfidf_index(self, df: list[tuple[str, int]]):
+        # documents whose description is gone can't be recounted and leave the index
+        try:
+            self.cursor.execute('''
+                DELETE FROM tfidf_doc
+                WHERE id NOT IN (SELECT id FROM linkedin WHERE description != '')
+            ''')
+            self.cursor.execute("DELETE FROM tfidf_term")
+            self.cursor.executemany("INSERT INTO tfidf_term (term, df) VALUES (?, ?)", df)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def get_indexed_ids(self, ids: list[int]) -> set[int]:
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_id (id INTEGER PRIMARY KEY)")
+        self.cursor.execute("DELETE FROM lookup_id")
+        self.cursor.executemany("INSERT OR IGNORE INTO lookup_id VALUES (?)", [(id,) for id in ids])
+        self.cursor.execute('''
+            SELECT d.id FROM tfidf_doc d
+            JOIN lookup_id l ON l.id = d.id
+        ''')
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def get_descriptions(self, stages: list[str], limit: int = 500) -> list[str]:
+        placeholders = ", ".join("?" * len(stages))
+        self.cursor.execute(f'''
+            SELECT description FROM linkedin
+            WHERE stage IN ({placeholders})
+            AND discarded = 0
+            AND description != ''
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (*stages, limit,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_cursor(self, search: str, location: str):
+        self.cursor.execute('''
+            SELECT page, last_id FROM resume_cursor
+            WHERE search = ?
+            AND location = ?
+        ''', (search, location,))
+        return self.cursor.fetchone()
+
+    def update_cursor(self, search: str, location: str, page: int, last_id: int):
+        self.cursor.execute('''
+            INSERT INTO resume_cursor (search, location, page, last_id)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (search, location)
+            DO UPDATE SET page = excluded.page, last_id = excluded.last_id
+        ''', (search, location, page, last_id,))
+        self.connection.commit()
+
+    def delete_cursor(self, search: str, location: str):
+        self.cursor.execute('''
+            DELETE FROM resume_cursor
+            WHERE search = ?
+            AND location = ?
+        ''', (search, location,))
+        self.connection.commit()
+
+    def get_size(self) -> int:
+        page_count = self.cursor.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.cursor.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def get_free_pages(self) -> int:
+        return self.cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def is_incremental_vacuum(self) -> bool:
+        # 0 = none, 1 = full, 2 = incremental
+        return self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def vacuum(self, incremental: bool = True):
+        if incremental:
+            # the pragma frees one page per step and returns no rows, a plain execute only steps it once
+            self.connection.executescript("PRAGMA incremental_vacuum;")
+        else:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.cursor.execute("VACUUM")
+        self.connection.commit()
+
+    def close_connection(self):
+        # closes the connection of every thread, a session should end once its work is done
+        with self.lock:
+            self.closed = True
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            connection.close()
+        self.local = threading.local()
@@ -1,5 +1,5 @@
 class Job:
-    def __init__(self, id: int, title, company, location, description="", logo=None, matching_keywords: list[str]=None, years_exp=None):
+    def __init__(self, id: int, title, company, location, description="", logo=None, matching_keywords: list[str]=None, years_exp=None, profiles: dict=None, score: float=None, scores: dict=None):
         self.id = id
         self.title = title
         self.company = company
@@ -8,6 +8,9 @@ class Job:
         self.logo = logo
         self.matching_keywords = matching_keywords
         self.years_exp = years_exp
+        self.profiles = profiles
+        self.score = score
+        self.scores = scores
     
     def __str__(self):
         return "\nid: %s\ntitle: %s\ncompany: %s\nlocation: %s\n" % (self.id, self.title, self.company, self.location)
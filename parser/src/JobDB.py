@@ -2,7 +2,8 @@ from Job import Job
 
 
 class JobDB:
-    def __init__(self, job: Job, stage: str, discarded: bool):
+    def __init__(self, job: Job, stage: str, discarded: bool, search: str = ""):
         self.info = job
         self.stage = stage
-        self.discarded = discarded
\ No newline at end of file
+        self.discarded = discarded
+        self.search = search
\ No newline at end of file
@@ -0,0 +1,146 @@
+import argparse
+import json
+import logging
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy import sparse
+
+from Database import Database
+from filterfile import FILTERS_FILE, add_excluded_words
+from profiles import all_keywords, load_profiles
+
+logger = logging.getLogger(__name__)
+
+MIN_JOBS = 5            # fewer judged jobs than this is never enough evidence
+MAX_NGRAM = 2
+Z = 1.96                # 95% wilson interval
+SUGGEST_CONFIDENCE = 0.8    # lower bound of the discard rate to suggest an exclusion
+APPLY_CONFIDENCE = 0.95     # lower bound of the discard rate to apply it with --apply
+
+WORD_RE = re.compile(r"[A-Za-z0-9+#]+")
+
+
+class Suggestion:
+    def __init__(self, key: str, value: str, jobs: int, discarded: int):
+        self.key = key
+        self.value = value
+        self.jobs = jobs
+        self.discarded = discarded
+        self.confidence = float(wilson_lower_bound(discarded, jobs)) if jobs > 0 else 0.0
+
+    def __str__(self):
+        return "%s \"%s\": %s/%s discarded (confidence %.2f)" % (
+            self.key, self.value, self.discarded, self.jobs, self.confidence)
+
+
+def wilson_lower_bound(positive, total):
+    # lowest discard rate the counts support, small samples score low even when every job was discarded.
+    # works on numbers and numpy arrays, total must be positive
+    p = positive / total
+    center = p + Z * Z / (2 * total)
+    margin = Z * np.sqrt(p * (1 - p) / total + Z * Z / (4 * total * total))
+    return (center - margin) / (1 + Z * Z / total)
+
+
+def ngrams(title: str) -> list[str]:
+    words = WORD_RE.findall(title)
+    return list({" ".join(words[i:i + n]) for n in range(1, MAX_NGRAM + 1) for i in range(len(words) - n + 1)})
+
+
+def suggest_companies(db: Database, excluded: list[str]) -> list[Suggestion]:
+    # parse.py drops a company found inside an excluded entry
+    suggestions = []
+    for company, jobs, discarded in db.get_company_discards(MIN_JOBS):
+        if any(company in excluded_company for excluded_company in excluded):
+            continue
+        suggestion = Suggestion("excluded_companies", company, jobs, discarded)
+        if suggestion.confidence >= SUGGEST_CONFIDENCE:
+            suggestions.append(suggestion)
+    return suggestions
+
+
+def suggest_title_words(db: Database, excluded: list[str], protected: list[str]) -> list[Suggestion]:
+    rows = db.get_title_discards()
+    if not rows:
+        return []
+    titles = np.array([title for title, _ in rows], dtype=str)
+    discarded = np.array([flag for _, flag in rows], dtype=np.int64)
+
+    # binary title x n-gram matrix, counted case insensitively
+    title_ngrams = [ngrams(title) for title in titles]
+    surface_forms: dict[str, Counter] = defaultdict(Counter)
+    for grams in title_ngrams:
+        for gram in grams:
+            surface_forms[gram.lower()][gram] += 1
+    vocabulary = {gram: i for i, gram in enumerate(surface_forms)}
+    title_index = np.repeat(np.arange(len(titles)), [len(grams) for grams in title_ngrams])
+    gram_index = np.fromiter((vocabulary[gram.lower()] for grams in title_ngrams for gram in grams),
+                             dtype=np.int64, count=len(title_index))
+    matrix = sparse.csr_matrix((np.ones(len(title_index)), (title_index, gram_index)),
+                               shape=(len(titles), len(vocabulary)))
+    matrix.data[:] = 1  # the same n-gram twice in one title counts once
+
+    jobs = np.asarray(matrix.sum(axis=0)).ravel()
+    discards = matrix.T @ discarded
+    confidence = wilson_lower_bound(discards, np.maximum(jobs, 1))
+    candidates = [gram for gram, i in vocabulary.items() if jobs[i] >= MIN_JOBS and confidence[i] >= SUGGEST_CONFIDENCE]
+
+    protected_lower = [p.lower() for p in protected]
+    suggestions = []
+    for gram in candidates:
+        value = surface_forms[gram].most_common(1)[0][0]
+        if any(gram in p for p in protected_lower) or any(word in value for word in excluded):
+            continue
+        # parse.py matches title words as case sensitive substrings, score the value the same way
+        matches = np.char.find(titles, value) >= 0
+        suggestion = Suggestion("excluded_title_words", value, int(matches.sum()), int(discarded[matches].sum()))
+        if suggestion.jobs >= MIN_JOBS and suggestion.confidence >= SUGGEST_CONFIDENCE:
+            suggestions.append(suggestion)
+
+    # skip values already covered by a more confident one, "Senior" covers "Senior Manager"
+    suggestions.sort(key=lambda s: (-s.confidence, len(s.value)))
+    kept: list[Suggestion] = []
+    for suggestion in suggestions:
+        if not any(k.value in suggestion.value for k in kept):
+            kept.append(suggestion)
+    return kept
+
+
+def suggest(db: Database, filters: dict) -> list[Suggestion]:
+    # search titles and match keywords are never suggested, they describe the wanted jobs
+    protected = list(filters['search_params']) + all_keywords(load_profiles(filters))
+    suggestions = suggest_companies(db, filters['excluded_companies'])
+    suggestions += suggest_title_words(db, filters['excluded_title_words'], protected)
+    return sorted(suggestions, key=lambda s: s.confidence, reverse=True)
+
+
+def apply(suggestions: list[Suggestion], filters_file: str = FILTERS_FILE) -> list[Suggestion]:
+    applied = [s for s in suggestions if s.confidence >= APPLY_CONFIDENCE]
+    for key in ("excluded_companies", "excluded_title_words"):
+        values = [s.value for s in applied if s.key == key]
+        if values:
+            add_excluded_words(key, values, filters_file)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level='INFO')
+    parser = argparse.ArgumentParser(description="Suggest exclusions from the discard history of judged jobs")
+    parser.add_argument("--apply", action="store_true",
+                        help=f"add suggestions with confidence >= {APPLY_CONFIDENCE} to {FILTERS_FILE}")
+    args = parser.parse_args()
+
+    with open(FILTERS_FILE, 'r') as f:
+        filters = json.load(f)
+    with Database() as db:
+        suggestions = suggest(db, filters)
+
+    for suggestion in suggestions:
+        logger.info(f"Suggest {suggestion}")
+    if not suggestions:
+        logger.info("No exclusions to suggest")
+    elif args.apply:
+        for suggestion in apply(suggestions):
+            logger.info(f"Applied {suggestion}")
@@ -0,0 +1,25 @@
+import json
+import os
+import threading
+import uuid
+
+FILTERS_FILE = "filters.json"
+
+# API requests are handled on several threads, each edit reads the file after the previous one was written
+write_lock = threading.Lock()
+
+
+def add_excluded_words(key: str, values: list[str], filters_file: str = FILTERS_FILE):
+    with write_lock:
+        with open(filters_file, 'r') as f:
+            data = json.load(f)
+            data[key].extend(value for value in values if value not in data[key])
+
+        # written to a randomly named file next to it and renamed over it,
+        # a reader (or a crash) never sees a half written filters.json
+        temp_file = os.path.join(os.path.dirname(filters_file), str(uuid.uuid4()))
+
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+
+        os.replace(temp_file, filters_file)
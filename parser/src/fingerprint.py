@@ -0,0 +1,64 @@
+import re
+from hashlib import blake2b
+
+from Job import Job
+
+HASH_BITS = 64
+BANDS = 8
+BAND_BITS = HASH_BITS // BANDS
+# any hash within BANDS - 1 bits shares at least one band exactly, so the
+# band indexes find every candidate without scanning the whole table
+MAX_DISTANCE = 6
+SHINGLE_SIZE = 3
+
+WORD_RE = re.compile(r"[a-z0-9+#]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return WORD_RE.findall((text or "").lower())
+
+
+def features(job: Job) -> set[str]:
+    words = tokenize(job.description)
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+    shingles.add("title:" + " ".join(tokenize(job.title)))
+    shingles.add("company:" + " ".join(tokenize(job.company)))
+    return shingles
+
+
+def simhash(job: Job) -> int:
+    counts = [0] * HASH_BITS
+    total = 0
+    for feature in features(job):
+        h = int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), "big")
+        total += 1
+        bit = 0
+        while h:
+            if h & 1:
+                counts[bit] += 1
+            h >>= 1
+            bit += 1
+
+    value = 0
+    for bit, count in enumerate(counts):
+        if count * 2 > total:
+            value |= 1 << bit
+    return value
+
+
+def bands(value: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def distance(a: int, b: int) -> int:
+    return ((a ^ b) & ((1 << HASH_BITS) - 1)).bit_count()
+
+
+def to_signed(value: int) -> int:
+    # sqlite integers are signed 64 bit
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
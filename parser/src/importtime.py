@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+# parser modules that tools, tests and the API server import
+MODULES = ["Database", "fingerprint", "resume", "maintenance", "inference", "scoring", "resource", "parse"]
+
+
+def import_time(module: str) -> int:
+    # cumulative microseconds reported by python -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1])
+    return 0
+
+
+if __name__ == "__main__":
+    for module in MODULES:
+        print(f"{module:<12} {import_time(module) / 1000:8.1f} ms")
@@ -1,81 +1,150 @@
 import os
 import re
+import time
 
+import huggingface_hub
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+
+import runstats
 
 # Note: Rate limit of 1,000 requests per day
 # CHAT_MODEL = "mistralai/Mistral-7B-Instruct-v0.3"
 QA_MODEL = "deepset/roberta-base-squad2"
-load_dotenv()
 
-client = InferenceClient(
-    api_key=os.getenv("API_TOKEN"), 
-    headers={"x-wait-for-model": "true", "x-use-cache": "false"}
-)
+# created by get_client() on the first request
+client = None
 
 #! change variations based on education in .env
-degree_variations = {
+degree_variations = (
     "bachelor",
     "bachelor's",
-    "bs ",
-    "b.s ",
-    " bs",
-    " b.s",
+    "bs",
+    "b.s",
+)
+
+# (degree question, years question), tried in order until the years answer has a number
+QUESTION_SETS = (
+    ("What is the degree required?", "How many years of experience?"),
+    ("What is the educational degree required?", "How many years of work experience?"),
+    ("What is the minimum degree required?", f"How many years of {degree_variations[0]} experience?"),
+)
+# every question that can be asked about a description
+QUESTIONS = tuple(q for question_set in QUESTION_SETS for q in question_set)
+
+# longest variation first so "bachelor's" is not cut short by "bachelor",
+# a trailing plural or possessive is allowed for "Bachelors" and "Bachelor’s"
+DEGREE_RE = re.compile(
+    r"(?<![a-z])(?:%s)(?:['’]?s)?(?![a-z])" % "|".join(re.escape(v) for v in sorted(degree_variations, key=len, reverse=True)),
+    re.IGNORECASE
+)
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
 }
-questions = [
-    "What is the degree required?",
-    "How many years of experience?"
-]
-alt_question_1 = [
-    "What is the educational degree required?",
-    "What is the minimum degree required?"
-]
-alt_question_2 = [
-    "How many years of work experience?",
-    f"How many years of {degree_variations[0]} experience?",
-]
+# skip digits that are part of a larger figure like "$120,000" or "2.5"
+NUMBER = r"(?<![\d,.$])\b(\d+|%s)\b(?![,.]\d)" % "|".join(NUMBER_WORDS)
+RANGE_RE = re.compile(NUMBER + r"\s*(?:-|–|to)\s*" + NUMBER, re.IGNORECASE)
+MINIMUM_RE = re.compile(r"(?:" + NUMBER + r"\s*\+|(?:at least|minimum of|min\.?)\s*" + NUMBER + r")", re.IGNORECASE)
+SINGLE_RE = re.compile(NUMBER, re.IGNORECASE)
+MAX_YEARS = 30  # larger numbers are salaries, dates, etc.
 
-def job_desc_match_qualifications(job_desc: str, education: str, years_exp) -> bool:
-    attempts = 0
-    while attempts < 3:
-        if attempts > 0:
-            questions[0] = alt_question_1[attempts - 1]
-            questions[1] = alt_question_2[attempts - 1]
-        qa_pairs: dict = question_answer(questions, job_desc)
-        answer_string = " ".join(qa_pairs.values()).strip().lower().replace(".", "")
-        numbers = re.findall(r'\d+', answer_string)
-        le = len(numbers)
-        if le > 0:
+def to_number(value: str) -> int:
+    return int(value) if value.isdigit() else NUMBER_WORDS[value.lower()]
+
+def parse_years(answer: str) -> tuple[int, int | None] | None:
+    # (minimum, maximum) years of experience, maximum is None for "3+ years"
+    match = RANGE_RE.search(answer)
+    if match:
+        low, high = sorted((to_number(match.group(1)), to_number(match.group(2))))
+        if high <= MAX_YEARS:
+            return low, high
+
+    match = MINIMUM_RE.search(answer)
+    if match:
+        value = to_number(match.group(1) or match.group(2))
+        if value <= MAX_YEARS:
+            return value, None
+
+    for match in SINGLE_RE.finditer(answer):
+        value = to_number(match.group(1))
+        if value <= MAX_YEARS:
+            return value, value
+    return None
+
+def match_answers(answers: dict, job_desc: str, years: int) -> bool:
+    years_range = None
+    for _, years_question in QUESTION_SETS:
+        years_range = parse_years(answers.get(years_question, ""))
+        if years_range is not None:
             break
-        attempts += 1
-
-    years = int(years_exp)
-
-    if any(value in answer_string for value in degree_variations) \
-    or any(value in job_desc.strip().lower() for value in degree_variations):
-        if le == 0:
-            return True
-        elif le == 1:
-            return years in (le - 1, le, le + 1)
-        else:
-            min_val = int(min(numbers))
-            max_val = int(max(numbers))
-            return min_val <= years <= max_val
-    else:
+
+    degree_answers = " ".join(answers.values())
+    if DEGREE_RE.search(degree_answers) is None and DEGREE_RE.search(job_desc) is None:
         return False
-    
-def question_answer(questions: list, description):
-    answers = {}
-    for q in questions:
-        result = client.question_answering(
-            model=QA_MODEL,
-            question=q,
-            context=description
+
+    if years_range is None:
+        return True
+    low, high = years_range
+    if high is None:
+        return years >= low - 1
+    if low == high:
+        # allow one year either way for a single number
+        return low - 1 <= years <= high + 1
+    return low <= years <= high
+
+def job_desc_match_qualifications(job_desc: str, education: str, years_exp) -> bool:
+    answers = question_answer(QUESTION_SETS, job_desc)
+    return match_answers(answers, job_desc, int(years_exp))
+
+def get_client():
+    global client
+    if client is None:
+        load_dotenv()
+        client = huggingface_hub.InferenceClient(
+            api_key=os.getenv("API_TOKEN"),
+            headers={"x-wait-for-model": "true", "x-use-cache": "false"}
         )
-        answers[q] = result.answer
+    return client
+
+def question_answer(question_sets: tuple, description) -> dict:
+    # one request per question, the inference API has no batched question answering.
+    # stops after the first set whose years answer has a number, usually two requests
+    answers = {}
+    for question_set in question_sets:
+        for q in question_set:
+            result = get_client().question_answering(
+                model=QA_MODEL,
+                question=q,
+                context=description
+            )
+            runstats.count("inference_calls")
+            answers[q] = result.answer
+        if parse_years(answers[question_set[1]]) is not None:
+            break
     return answers
 
 # def status():
 #     status = client.get_model_status(QA_MODEL)
 #     return status.loaded, status.state
+
+if __name__ == "__main__":
+    # benchmark answer parsing and degree detection, the inference request is not included
+    import random
+    random.seed(0)
+    filler = "We are looking for an engineer to build and ship features with the team. " * 20
+    degrees = ["Bachelor's degree in Computer Science", "BS in Engineering", "High school diploma", ""]
+    experience = ["3+ years", "2-4 years", "five years", "at least 2 years", "no experience listed", "3 to 5 years"]
+
+    samples = []
+    for _ in range(5000):
+        degree = random.choice(degrees)
+        years = random.choice(experience)
+        answers = {q: "" for q in QUESTIONS}
+        answers[QUESTION_SETS[0][0]] = degree
+        answers[QUESTION_SETS[0][1]] = years
+        samples.append((answers, f"{filler} Requirements: {degree}, {years}. {filler}"))
+
+    start = time.perf_counter()
+    matched = sum(match_answers(answers, job_desc, 3) for answers, job_desc in samples)
+    elapsed = time.perf_counter() - start
+    print(f"{len(samples)} descriptions in {elapsed:.3f}s ({len(samples) / elapsed:,.0f}/s), {matched} matched")
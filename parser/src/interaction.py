@@ -0,0 +1,102 @@
+import logging
+import random
+import time
+from typing import Callable
+
+from selenium.common.exceptions import (NoSuchElementException,
+                                        StaleElementReferenceException,
+                                        TimeoutException)
+
+import runstats
+
+logger = logging.getLogger(__name__)
+
+# a stale element is looked up again on the next attempt, the action passed to retry() resolves its own elements
+RETRY_EXCEPTIONS = (StaleElementReferenceException, NoSuchElementException, TimeoutException)
+BASE_DELAY = 0.5    # seconds before the first retry, doubled on each attempt
+MAX_DELAY = 30
+FAILURE_THRESHOLD = 5   # interactions failing in a row before the breaker opens
+COOLDOWN = 300          # seconds the breaker stays open
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: float = None
+
+    def check(self):
+        if self.opened_at is None:
+            return
+        if self.clock() - self.opened_at < self.cooldown:
+            raise CircuitOpenError(f"LinkedIn failed {self.failures} time(s) in a row")
+        # let one interaction through, another failure opens the breaker again
+        self.opened_at = None
+        self.failures = self.threshold - 1
+
+    def success(self):
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold and self.opened_at is None:
+            logger.warning(f"Circuit breaker open for {self.cooldown}s after {self.failures} failure(s)")
+            self.opened_at = self.clock()
+
+
+# shared by every interaction of the parser process
+breaker = CircuitBreaker()
+
+
+def backoff(attempt: int, base: float = BASE_DELAY) -> float:
+    # full jitter, retries of many jobs never line up on the same delays
+    return random.uniform(0, min(MAX_DELAY, base * 2 ** attempt))
+
+
+def retry(action: Callable, attempts: int = 3, exceptions: tuple = RETRY_EXCEPTIONS, recover: Callable = None,
+          base: float = BASE_DELAY, trip: bool = True):
+    # calls action until it returns, recover() runs before each retry (e.g. a page refresh).
+    # the last exception is raised once attempts run out, and counts toward the breaker if trip is set
+    for attempt in range(attempts):
+        breaker.check()
+        try:
+            result = action()
+        except exceptions as e:
+            if attempt == attempts - 1:
+                if trip:
+                    breaker.failure()
+                raise
+            runstats.count("retries")
+            delay = backoff(attempt, base)
+            logger.debug(f"{type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{attempts})")
+            time.sleep(delay)
+            if recover is not None:
+                recover()
+        else:
+            breaker.success()
+            return result
+
+
+class Throttle:
+    # spaces calls at least interval seconds apart, time spent between calls counts toward the interval
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last: float = None
+
+    def wait(self):
+        if self.last is not None:
+            remaining = self.interval - (time.monotonic() - self.last)
+            if remaining > 0:
+                time.sleep(remaining)
+        self.last = time.monotonic()
@@ -0,0 +1,182 @@
+import csv
+import logging
+import math
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_FILE = "locations.csv"
+EARTH_RADIUS_MILES = 3958.8
+
+# workplace type LinkedIn appends to the card caption, "Seattle, WA (Hybrid)"
+ONSITE = "on-site"
+HYBRID = "hybrid"
+REMOTE = "remote"
+
+KEEP = "keep"
+DISCARD = "discard"
+
+STATE_NAMES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia",
+    "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois",
+    "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
+    "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon",
+    "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia",
+    "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+}
+
+# names that don't follow "City, ST", mapped to a key that does
+ALIASES = {
+    "new york city": "new york, ny",
+    "nyc": "new york, ny",
+    "washington dc": "washington, dc",
+    "silicon valley": "san jose, ca",
+    "tampa bay": "tampa, fl",
+    "dfw": "dallas, tx",
+}
+
+WORKPLACE_RE = re.compile(r"\s*\((on-site|hybrid|remote)\)\s*$", re.IGNORECASE)
+# "Greater Seattle Area", "San Francisco Bay Area", "Austin, Texas Metropolitan Area"
+METRO_RE = re.compile(r"^greater\s+|\s+(?:bay\s+)?(?:metropolitan\s+|metro\s+)?(?:area|region|metroplex)$|\s+metro$")
+
+
+def normalize(text: str) -> str:
+    text = " ".join(text.lower().replace(".", "").split())
+    return re.sub(r"\bsaint\b", "st", text)
+
+
+class Place:
+    def __init__(self, city: str, state: str, lat: float, lon: float):
+        self.city = city
+        self.state = state
+        self.lat = lat
+        self.lon = lon
+
+    def __str__(self):
+        return f"{self.city}, {self.state}"
+
+
+class Location:
+    def __init__(self, text: str, place: Place = None, workplace: str = None):
+        self.text = text
+        self.place = place
+        self.workplace = workplace
+
+    def __str__(self):
+        return self.text
+
+
+def distance_miles(a: Place, b: Place) -> float:
+    # haversine, accurate to well under a mile at these distances
+    lat_a, lat_b = math.radians(a.lat), math.radians(b.lat)
+    d_lat = lat_b - lat_a
+    d_lon = math.radians(b.lon - a.lon)
+    h = math.sin(d_lat / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+class Gazetteer:
+    def __init__(self, places: list[Place]):
+        # every spelling is precomputed, a lookup is a dict hit after normalizing
+        self.lookup: dict[str, Place] = {}
+        for place in places:
+            for key in (f"{place.city}, {place.state}", f"{place.city}, {STATE_NAMES[place.state]}", place.city):
+                # the table is ordered by size, a bare city name resolves to the largest one
+                self.lookup.setdefault(normalize(key), place)
+        for alias, key in ALIASES.items():
+            self.lookup[alias] = self.lookup[key]
+
+    def find(self, text: str) -> Place:
+        key = normalize(text)
+        if key in self.lookup:
+            return self.lookup[key]
+
+        # metro areas resolve to their main city, "dallas-fort worth" to dallas
+        key = METRO_RE.sub("", key)
+        for candidate in (key, key.split("-")[0].strip()):
+            if candidate in self.lookup:
+                return self.lookup[candidate]
+        return None
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path: str = GAZETTEER_FILE) -> Gazetteer:
+    with open(path, newline='') as f:
+        places = [Place(row['city'], row['state'], float(row['lat']), float(row['lon'])) for row in csv.DictReader(f)]
+    return Gazetteer(places)
+
+
+@lru_cache(maxsize=4096)
+def parse_caption(caption: str) -> Location:
+    # the same few captions repeat across every page of a search
+    text = caption.strip()
+    workplace = None
+    match = WORKPLACE_RE.search(text)
+    if match:
+        workplace = match[1].lower()
+        text = text[:match.start()]
+    elif normalize(text) == REMOTE:
+        workplace = REMOTE
+    return Location(text, load_gazetteer().find(text), workplace)
+
+
+class LocationFilter:
+    def __init__(self, radius_miles: float = None, include: dict = None, exclude: dict = None,
+            remote: str = KEEP, hybrid: str = KEEP, unknown: str = KEEP):
+        gazetteer = load_gazetteer()
+        self.radius_miles = radius_miles
+        self.include = [(self.resolve(gazetteer, name), miles) for name, miles in (include or {}).items()]
+        self.exclude = [(self.resolve(gazetteer, name), miles) for name, miles in (exclude or {}).items()]
+        self.remote = remote
+        self.hybrid = hybrid
+        self.unknown = unknown
+        self.areas_by_search: dict[str, list[tuple[Place, float]]] = {}
+
+    @staticmethod
+    def resolve(gazetteer: Gazetteer, name: str) -> Place:
+        place = gazetteer.find(name)
+        if place is None:
+            raise ValueError(f"Unknown location in location_filter: {name}")
+        return place
+
+    def areas(self, search_location: str) -> list[tuple[Place, float]]:
+        # the search's own location is a center too, so each title only needs one location
+        if search_location not in self.areas_by_search:
+            areas = list(self.include)
+            if self.radius_miles is not None:
+                center = load_gazetteer().find(search_location)
+                if center is None:
+                    logger.warning(f"Location filter: \"{search_location}\" is not in {GAZETTEER_FILE}, radius not applied")
+                else:
+                    areas.append((center, self.radius_miles))
+            self.areas_by_search[search_location] = areas
+        return self.areas_by_search[search_location]
+
+    def is_excluded(self, caption: str, search_location: str) -> bool:
+        location = parse_caption(caption)
+        if location.workplace == REMOTE:
+            return self.remote == DISCARD
+        if location.workplace == HYBRID and self.hybrid == DISCARD:
+            return True
+
+        place = location.place
+        if place is None:
+            return self.unknown == DISCARD
+        if any(distance_miles(place, center) <= miles for center, miles in self.exclude):
+            return True
+
+        areas = self.areas(search_location)
+        return bool(areas) and not any(distance_miles(place, center) <= miles for center, miles in areas)
+
+
+def load_location_filter(filters: dict) -> LocationFilter:
+    # optional, without it only excluded_expanded_locations applies
+    if 'location_filter' not in filters:
+        return None
+    return LocationFilter(**filters['location_filter'])
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from Database import Database
+from lazy import lazy_import
+
+scoring = lazy_import("scoring")
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+BATCH_PAUSE = 0.05  # seconds between batches, lets other connections write
+
+
+class CompactionReport:
+    def __init__(self, rows: int = 0, bytes: int = 0, seconds: float = 0):
+        self.rows = rows
+        self.bytes = bytes
+        self.seconds = seconds
+
+    def __str__(self):
+        return "%s expired row(s) deleted, %s bytes reclaimed in %.2fs" % (self.rows, self.bytes, self.seconds)
+
+
+def compact(db: Database, batch_size: int = BATCH_SIZE) -> CompactionReport:
+    start = time.perf_counter()
+    size_before = db.get_size()
+
+    rows = 0
+    while True:
+        deleted = db.delete_expired(limit=batch_size)
+        rows += deleted
+        if deleted < batch_size:
+            break
+        time.sleep(BATCH_PAUSE)
+
+    if rows > 0:
+        # the tf-idf vocabulary would otherwise keep every term of every job ever scored
+        scoring.rebuild_index(db)
+
+    if not db.is_incremental_vacuum():
+        # databases created before auto_vacuum was enabled need one full VACUUM
+        logger.info("Switching database to incremental vacuum...")
+        db.vacuum(incremental=False)
+    elif db.get_free_pages() > 0:
+        db.vacuum(incremental=True)
+
+    # the one-time full VACUUM can grow a database that had little free space
+    report = CompactionReport(rows, max(0, size_before - db.get_size()), time.perf_counter() - start)
+    logger.info(f"Maintenance: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level='INFO')
+    with Database() as db:
+        compact(db)
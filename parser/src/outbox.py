@@ -0,0 +1,134 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from Database import Database
+from lazy import lazy_import
+
+jobschema = lazy_import("jobschema")
+requests = lazy_import("requests")
+
+logger = logging.getLogger(__name__)
+
+KIND_JOBS = "jobs"
+KIND_ERROR = "error"
+
+# same stages as parse.py
+STAGE_PREP_SEND = "prep_send"
+STAGE_CMPLT = "completed"
+
+POLL_INTERVAL = 60      # seconds between checks for due messages
+LEASE = 120             # seconds a claimed message is hidden from other senders
+BASE_BACKOFF = 5
+MAX_BACKOFF = 30 * 60
+REQUEST_TIMEOUT = 30
+MAX_ATTEMPTS = 20       # about 5 hours of retries before a message is dead-lettered
+
+
+def enqueue_jobs(db: Database, batches: list, job_ids: list[int]):
+    # jobs move to STAGE_CMPLT once every batch carrying them is acknowledged by the bot
+    messages = [
+        (KIND_JOBS, batch.run_id, batch.model_dump_json(), [int(posting.id) for posting in batch.postings])
+        for batch in batches
+    ]
+    db.enqueue_outbox(messages, job_ids, pending_stage=STAGE_PREP_SEND, done_stage=STAGE_CMPLT)
+
+
+def enqueue_error(db: Database, report):
+    db.enqueue_outbox([(KIND_ERROR, report.run_id, report.model_dump_json(), [])])
+
+
+def deliver(kind: str, payload: str):
+    # raises unless the bot has the message
+    if kind == KIND_ERROR:
+        report = jobschema.ErrorReport.model_validate_json(payload)
+        response = requests.post(f"{os.getenv('BOT_URL')}/error", json=report.model_dump(), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return
+
+    batch = jobschema.JOB_BATCH.validate_json(payload)
+    # msgpack is smaller and faster to parse, json is used when it isn't installed
+    content_type = jobschema.MSGPACK if jobschema.has_msgpack() else jobschema.JSON
+    body, headers = jobschema.encode(batch, content_type)
+    response = requests.post(f"{os.getenv('BOT_URL')}/receive", data=body, headers=headers, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    ack = jobschema.BATCH_ACK.validate_json(response.content)
+    if ack.run_id != batch.run_id or ack.batch != batch.batch or ack.received != len(batch.postings):
+        raise ValueError(f"Batch {batch.batch} of run {batch.run_id} was not acknowledged: {ack}")
+
+
+def backoff(attempts: int) -> float:
+    delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempts)
+    return random.uniform(delay / 2, delay)
+
+
+def is_rejected(e: Exception) -> bool:
+    # the bot answered and won't accept the message however often it is sent, e.g. a schema version mismatch
+    response = getattr(e, "response", None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+
+
+def drain(db: Database) -> int:
+    # sends due messages oldest first, a failed message holds back the rest of its run only.
+    # returns the number delivered
+    delivered = 0
+    while True:
+        row = db.claim_outbox(time.time(), LEASE)
+        if row is None:
+            return delivered
+        outbox_id, kind, payload, attempts = row
+        try:
+            deliver(kind, payload)
+        except (requests.RequestException, ValueError) as e:
+            if is_rejected(e) or attempts + 1 >= MAX_ATTEMPTS:
+                logger.error(f"Outbox: {kind} message {outbox_id} dead-lettered after {attempts + 1} attempt(s): {e}")
+                db.kill_outbox(outbox_id, str(e))
+                continue
+            delay = backoff(attempts)
+            logger.warning(f"Outbox: sending {kind} message {outbox_id} failed ({e}), retrying in {delay:.0f}s")
+            db.fail_outbox(outbox_id, time.time() + delay, str(e))
+            continue
+        db.ack_outbox(outbox_id, STAGE_CMPLT)
+        delivered += 1
+        logger.info(f"Outbox: {kind} message {outbox_id} delivered")
+
+
+class OutboxSender(threading.Thread):
+    def __init__(self, db: Database, poll_interval: float = POLL_INTERVAL):
+        super().__init__(name="outbox-sender", daemon=True)
+        self.db = db
+        self.poll_interval = poll_interval
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.deadline: float = None
+
+    def run(self):
+        while True:
+            self.wake.clear()
+            try:
+                drain(self.db)
+                pending, next_attempt = self.db.get_outbox_pending()
+            except Exception as e:
+                logger.error(f"Outbox: {e}", exc_info=True)
+                pending, next_attempt = 1, time.time() + self.poll_interval
+
+            delay = self.poll_interval
+            if pending > 0:
+                delay = min(delay, max(0.0, next_attempt - time.time()))
+            if self.stopping.is_set():
+                # keep retrying until everything is delivered or the deadline passes
+                if pending == 0 or time.monotonic() + delay > self.deadline:
+                    return
+            self.wake.wait(delay)
+
+    def notify(self):
+        # a new message was enqueued, send it now
+        self.wake.set()
+
+    def stop(self, timeout: float = 0):
+        self.deadline = time.monotonic() + timeout
+        self.stopping.set()
+        self.wake.set()
+        self.join(timeout + REQUEST_TIMEOUT)
@@ -1,16 +1,25 @@
 import json
 import logging
 import os
+import sys
 import time
 import traceback
-
-import inference
-import requests
+import uuid
+from datetime import datetime, timezone
+
+import fingerprint
+import interaction
+import locations
+import maintenance
+import outbox
+import resume
+import runstats
 from Database import Database
 from dotenv import load_dotenv
 from Job import Job
 from JobDB import JobDB
-from JobResponse import JobPosting, JobResponse
+from lazy import lazy_import
+from profiles import DEFAULT_PROFILE, Profile, load_profiles
 from selenium import webdriver
 from selenium.common.exceptions import (NoSuchElementException,
                                         StaleElementReferenceException,
@@ -25,15 +34,16 @@ from selenium.webdriver.support import \
 from selenium.webdriver.support.relative_locator import locate_with
 from selenium.webdriver.support.wait import WebDriverWait
 
+# numpy/scipy, huggingface_hub and pydantic are only loaded once they are used
+inference = lazy_import("inference")
+scoring = lazy_import("scoring")
+jobschema = lazy_import("jobschema")
+
 logger = logging.getLogger(__name__)
-log_handler = logging.basicConfig(level='INFO')
-logger.info("parse.py starting.")
 
-options = Options()
-options.add_argument("--disable-gpu")
-options.add_argument("--log-level=3")
-driver = webdriver.Chrome(options=options)
-wait = WebDriverWait(driver, timeout=10, poll_frequency=0.5)
+# created by create_driver() when the parser starts
+driver: webdriver.Chrome = None
+wait: WebDriverWait = None
 
 STAGE_PARSE = "parse"
 STAGE_KEYWD = "keyword"
@@ -42,77 +52,160 @@ STAGE_MATCH = "match"
 STAGE_PREP_SEND = "prep_send"
 STAGE_CMPLT = "completed"
 
-load_dotenv()
-
-def main():
-    json_response = JobResponse(searches={})
+OUTBOX_TIMEOUT = 5 * 60     # seconds to keep retrying undelivered messages before exiting, the API server sends the rest
+FETCH_DELAY = 3.2   # seconds, will get http 429 error without this (too many requests)
+INFERENCE_DELAY = 1
+SEEK_PAGES = 3      # pages past a resumed search's saved page to look for the last job it parsed
+
+NO_RESULTS_BANNER = "jobs-search-no-results-banner"
+JOBS_LIST_XPATH = "//div[@data-results-list-top-scroll-sentinel]/following-sibling::ul"
+FILTERS_PANEL_XPATH = "//div[@aria-labelledby='reusable-search-advanced-filters-right-panel']"
+FILTER_XPATHS = (
+    ".//label[@for='advanced-filter-sortBy-DD']",                         # most recent
+    ".//label[@for='advanced-filter-timePostedRange-r86400']",            # past 24 hours
+    ".//button[@data-test-reusables-filters-modal-show-results-button]",
+)
+# id, title, company and location of every card in one round trip, read at once so no card goes stale mid-page
+READ_CARDS_SCRIPT = """
+return Array.from(arguments[0].querySelectorAll('li[data-occludable-job-id]')).map(li => {
+    const text = selector => { const e = li.querySelector(selector); return e ? e.innerText.trim() : null; };
+    return [li.getAttribute('data-occludable-job-id'), text('strong'),
+            text('.artdeco-entity-lockup__subtitle'), text('.artdeco-entity-lockup__caption')];
+});
+"""
+
+# paces requests to linkedin and the inference api, work done in between counts toward the delay
+fetch_throttle = interaction.Throttle(FETCH_DELAY)
+inference_throttle = interaction.Throttle(INFERENCE_DELAY)
+
+def main(searches: list[str] = None):
+    global driver, wait
     completed_ids = []
+    db = None
+    sender = None
 
+    load_dotenv()
     filters: dict = load_filters()
+    profiles = load_profiles(filters)
+    # one batch per profile, run_id lets the bot ignore a batch it has already received
+    run_id = str(uuid.uuid4())
+    run_started = datetime.now(timezone.utc)
+    batches = {
+        profile.name: jobschema.JobBatch(run_id=run_id, run_started=run_started,
+                                         profile=profile.name, channel_id=profile.channel_id)
+        for profile in profiles
+    }
 
     try:
+        db = Database()
+        # delivers messages left over from earlier runs while this one runs
+        sender = outbox.OutboxSender(db)
+        sender.start()
+
+        driver, wait = create_driver()
         navigate_jobs()
         login()
         wait.until(ExpectedConditions.url_changes)
         if "Security Verification" in driver.title:
             logger.warning("Redirected to security verification")
 
-        db = Database()
+        recorder = runstats.start_run(db, searches or list(filters['search_params']))
         for title, location in filters['search_params'].items():
-            if title not in json_response.searches:
-                json_response.searches[title] = {}
-            if location not in json_response.searches[title]:
-                json_response.searches[title][location] = {}
+            if searches and title not in searches:
+                continue
 
-            id_update_list = []
+            # the crawl is shared, matching fans out over every profile following this search
+            search_profiles = [profile for profile in profiles if profile.applies_to(title)]
+            if not search_profiles:
+                logger.info(f"Skipping \"{title}\", no profile follows it")
+                continue
 
-            search(title, location)
-            filter_recent_24hr()
-            wait_for_jobs_list_update()
+            for profile in search_profiles:
+                batches[profile.name].add_search(title, location)
+
+            try:
+                search(title, location)
+                filter_recent_24hr()
+                wait_for_jobs_list_update()
             
-            jobs_list = parse_jobs(db=db, filters=filters)
-            jobs_list_keyword_match = match_keywords(jobs_list=jobs_list, db=db, filters=filters)
-            jobs_list_full_match = match_qualifications(
-                jobs_list=jobs_list_keyword_match, 
-                db=db,
-                education=filters['user']['education'],
-                years_exp=filters['user']['years_exp'].get(title)
-            )
-
-            # populate response object with data
-            for job in jobs_list_full_match:
-                completed_ids.append(job.id)
-                id_update_list.append(job.id)
-                
-                json_response.searches[title][location][f"{job.id}"] = JobPosting(
-                    title=truncate(job.title, max_len=42),
-                    company=truncate(job.company, max_len=20),
-                    url=job.get_url()
+                recorder.start_stage(title, STAGE_PARSE)
+                jobs_list = parse_jobs(db=db, filters=filters, search_title=title, search_location=location)
+                recorder.end_stage(jobs_out=len(jobs_list))
+
+                recorder.start_stage(title, STAGE_KEYWD, jobs_in=len(jobs_list))
+                jobs_list_keyword_match = match_keywords(jobs_list=jobs_list, db=db, profiles=search_profiles, title=title)
+                recorder.end_stage(jobs_out=len(jobs_list_keyword_match))
+
+                jobs_list_keyword_match = scoring.rank_jobs(
+                    jobs_list=jobs_list_keyword_match,
+                    db=db,
+                    profiles=search_profiles,
+                    history=db.get_descriptions([STAGE_QUALF, STAGE_PREP_SEND, STAGE_CMPLT])
                 )
-            
-            # prepare jobs for send stage
-            for id in id_update_list:
-                db.update(id, stage=STAGE_PREP_SEND)
+                recorder.start_stage(title, STAGE_QUALF, jobs_in=len(jobs_list_keyword_match))
+                jobs_list_full_match = match_qualifications(
+                    jobs_list=jobs_list_keyword_match, 
+                    db=db,
+                    profiles=search_profiles,
+                    title=title
+                )
+                recorder.end_stage(jobs_out=len(jobs_list_full_match))
+
+                # populate each profile's batch with data
+                for job in jobs_list_full_match:
+                    completed_ids.append(job.id)
+    
+                    for name, qualified in load_job_profiles(db, job, search_profiles).items():
+                        # None is a resumed job judged before profiles were added
+                        if qualified is not False:
+                            batch = batches[name]
+                            batch.postings.append(jobschema.Posting(
+                                id=str(job.id),
+                                search=batch.add_search(title, location),
+                                title=job.title,
+                                company=job.company,
+                                url=job.get_url(),
+                                # jobs without a description aren't scored
+                                score=(job.scores or {}).get(name)
+                            ))
+            except interaction.CircuitOpenError as e:
+                # unfinished jobs keep their stage and are resumed by the next run
+                logger.warning(f"Stopping \"{title}\" early: {e}")
+                recorder.end_stage(jobs_out=0)
 
             navigate_jobs()
         logout()
         driver.close()
-        send_jobs(db, json_response, completed_ids)
+        send_jobs(db, sender, list(batches.values()), completed_ids)
         db.update_last_run()
+        recorder.finish("completed")
+
+        # clean up expired jobs once the run is done
+        maintenance.compact(db)
     except Exception as e:
         logger.error(e, exc_info=True)
+        if runstats.current is not None:
+            runstats.current.finish("failed")
         stack: str = traceback.format_exc()
-        if stack:
-            send_error(stack)
-        else:
-            send_error(str(e))
+        send_error(db, sender, jobschema.ErrorReport(error=stack or str(e), run_id=run_id, run_started=run_started))
     finally:
-        driver.quit()
-        db.close_connection()
+        if driver is not None:
+            driver.quit()
+        if sender is not None:
+            sender.stop(timeout=OUTBOX_TIMEOUT)
+        if db is not None:
+            db.close_connection()
         exit()
 
 # --- Helper Functions ---
 
+def create_driver() -> tuple[webdriver.Chrome, WebDriverWait]:
+    options = Options()
+    options.add_argument("--disable-gpu")
+    options.add_argument("--log-level=3")
+    chrome = webdriver.Chrome(options=options)
+    return chrome, WebDriverWait(chrome, timeout=10, poll_frequency=0.5)
+
 def login():
     wait.until(lambda d: driver.execute_script("return document.readyState") == "complete")
     session_key = driver.find_element(By.ID, "session_key")
@@ -127,28 +220,36 @@ def login():
 
     # Wait for 2FA
     wait.until(ExpectedConditions.title_contains("Jobs"))
-    time.sleep(1)
+    wait_for_page_load()
 
 def logout():
     profile_img = driver.find_element(By.XPATH, "//img[@width='24']")
     profile_img.click()
-    time.sleep(0.5)
-    logout_button = driver.find_element(By.XPATH, "//a[@href='/m/logout/']")
+    logout_button = wait.until(ExpectedConditions.element_to_be_clickable((By.XPATH, "//a[@href='/m/logout/']")))
     logout_button.click()
     time.sleep(3)
 
+def is_rate_limited() -> bool:
+    # chrome shows its own error page when linkedin answers with http 429
+    return driver.execute_script("return document.body !== null && document.body.innerText.includes('HTTP ERROR 429')")
+
+def wait_for_page_load():
+    wait.until(lambda d: driver.execute_script("return document.readyState") == "complete")
+
 def navigate_jobs():
     driver.get("https://www.linkedin.com/jobs")
     wait.until(ExpectedConditions.title_contains("Jobs"))
-    time.sleep(1)
+    wait_for_page_load()
 
 def search(title: str, location: str):
     logger.info(f"Search: \"{title}\" in {location}")
-    recent_searches = driver.find_element(By.XPATH, "//ul[@aria-label='Recent job searches']")
-    recent_searches_list = recent_searches.find_elements(By.TAG_NAME, "li")
 
-    try:
-        for li in recent_searches_list:
+    def submit_search():
+        if title in driver.title:
+            # an earlier attempt went through before its element went stale
+            return
+        recent_searches = driver.find_element(By.XPATH, "//ul[@aria-label='Recent job searches']")
+        for li in recent_searches.find_elements(By.TAG_NAME, "li"):
             text = li.text
             if title in text and location in text:
                 logger.info("Search: using recent search")
@@ -163,44 +264,30 @@ def search(title: str, location: str):
         search_box_location = driver.find_element(By.XPATH, "//input[@aria-label='City, state, or zip code']")
         search_box_location.clear()
         search_box_location.send_keys(location + Keys.ENTER)
-    except StaleElementReferenceException:
-        pass
-    finally:
-        wait.until(ExpectedConditions.title_contains(title))
+
+    interaction.retry(submit_search)
+    wait.until(ExpectedConditions.title_contains(title))
 
 def filter_recent_24hr():
-    time.sleep(1.5)
-    try:
-        # filter by most recent, past 24 hours
-        all_filters_button = driver.find_element(By.CLASS_NAME, "search-reusables__all-filters-pill-button")
-        wait.until(ExpectedConditions.element_to_be_clickable(all_filters_button))
+    # filter by most recent, past 24 hours
+    def open_filters():
+        if any(panel.is_displayed() for panel in driver.find_elements(By.XPATH, FILTERS_PANEL_XPATH)):
+            return
+        all_filters_button = wait.until(ExpectedConditions.element_to_be_clickable(
+            (By.CLASS_NAME, "search-reusables__all-filters-pill-button")))
         all_filters_button.click()
-    except StaleElementReferenceException:
-        pass
-
-    try:
-        filters_panel = driver.find_element(By.XPATH, "//div[@aria-labelledby='reusable-search-advanced-filters-right-panel']")
-    except StaleElementReferenceException:
-        pass
-    time.sleep(1.5)
+        wait.until(ExpectedConditions.visibility_of_element_located((By.XPATH, FILTERS_PANEL_XPATH)))
 
-    attempts = 0
-    while attempts < 3:
-        try:
-            most_recent = filters_panel.find_element(By.XPATH, ".//label[@for='advanced-filter-sortBy-DD']")
-            wait.until(ExpectedConditions.element_to_be_clickable(most_recent))
-            most_recent.click()
+    def apply_filters():
+        # the panel is looked up on every attempt, clicking an option again keeps it selected
+        filters_panel = driver.find_element(By.XPATH, FILTERS_PANEL_XPATH)
+        for xpath in FILTER_XPATHS:
+            option = filters_panel.find_element(By.XPATH, xpath)
+            wait.until(ExpectedConditions.element_to_be_clickable(option))
+            option.click()
 
-            past_24hr = filters_panel.find_element(By.XPATH, ".//label[@for='advanced-filter-timePostedRange-r86400']")
-            wait.until(ExpectedConditions.element_to_be_clickable(past_24hr))
-            past_24hr.click()
-
-            show_results_button = filters_panel.find_element(By.XPATH, ".//button[@data-test-reusables-filters-modal-show-results-button]")
-            wait.until(ExpectedConditions.element_to_be_clickable(show_results_button))
-            show_results_button.click()
-            return
-        except StaleElementReferenceException:
-            attempts += 1
+    interaction.retry(open_filters)
+    interaction.retry(apply_filters)
 
 def wait_for_jobs_list_update():
     list_locator = locate_with(By.TAG_NAME, "div").below({By.CLASS_NAME: "jobs-search-results-list__header"})
@@ -212,108 +299,150 @@ def wait_for_jobs_list_update():
     except StaleElementReferenceException:
         logger.debug("StaleElementReferenceException")
 
-def parse_jobs(db: Database, filters: dict, parse_viewed = False) -> list[Job]:
+def wait_for_results():
+    wait.until(lambda d: d.find_elements(By.XPATH, JOBS_LIST_XPATH) and not d.find_elements(By.CLASS_NAME, NO_RESULTS_BANNER))
+
+def refresh_results():
+    driver.refresh()
+    wait.until_not(ExpectedConditions.title_is("LinkedIn"))
+
+def preload_jobs_list():
+    # scroll to preload all jobs in list
+    list_element = driver.find_element(By.XPATH, JOBS_LIST_XPATH)
+    scroll_origin = ScrollOrigin.from_element(list_element.find_element(By.TAG_NAME, "li"))
+    delta_y = 660   # 132 * 5
+    ActionChains(driver)\
+        .scroll_from_origin(scroll_origin, 0, 0)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 1)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 2)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 3)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 4)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 5)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 5)\
+        .pause(0.1)\
+        .scroll_from_origin(scroll_origin, 0, delta_y * 6)\
+        .perform()
+    return list_element
+
+def read_cards(list_element) -> list[tuple[str, str, str, str]]:
+    return driver.execute_script(READ_CARDS_SCRIPT, list_element)
+
+def parse_jobs(db: Database, filters: dict, search_title: str, search_location: str, parse_viewed = False) -> list[Job]:
     logger.info("Parsing Jobs...")
     parsed_jobs: list[Job] = []
     repeat_counter = 0
     stop_parsing = False
 
-    parsed_jobs = append_interrupted_jobs(db, parsed_jobs, STAGE_PARSE)
+    # resume an interrupted search from the last parsed page
+    cursor = resume.load_cursor(db, search_title, search_location)
+    if cursor is None:
+        cursor = resume.ParseCursor(search_title, search_location)
+    resume_page = cursor.page
+    resume_id = cursor.last_id
+    seeking = False
+    seek_limit = 0
 
     # # maybe make this a feature flag in future
     # # skip viewed jobs by default
 
-    for page_i in range(1, 40):
+    # get filters
+    excluded_titles_set = set(filters['excluded_title_words'])
+    excluded_companies_set = set(filters['excluded_companies'])
+    excluded_locations_set = set(filters['excluded_expanded_locations'])
+    location_filter = locations.load_location_filter(filters)
+
+    page_i = 1
+    while page_i < 40:
         logger.info(f"page {page_i}")
-        time.sleep(1)
-
-        attempts = 0
-        while attempts < 2:
-            if len(driver.find_elements(By.CLASS_NAME, "jobs-search-no-results-banner")) > 0:
-                driver.refresh()
-                time.sleep(0.1)
-                wait.until_not(ExpectedConditions.title_is("LinkedIn"))
-                attempts += 1
-            else:
-                break
-        
-        # get filters
-        excluded_titles_set = set(filters['excluded_title_words'])
-        excluded_companies_set = set(filters['excluded_companies'])
-        excluded_locations_set = set(filters['excluded_expanded_locations'])
+        runstats.count("pages")
 
-        attempts = 0
-        while attempts < 2:
-            try:
-                list_element = driver.find_element(By.XPATH, "//div[@data-results-list-top-scroll-sentinel]/following-sibling::ul")
-                job_list = list_element.find_elements(By.TAG_NAME, "li")
-                break
-            except StaleElementReferenceException:
-                pass
-            attempts += 1
-
-        # scroll to preload all jobs in list
-        scroll_origin = ScrollOrigin.from_element(job_list[0])
-        delta_y = 660   # 132 * 5
-        ActionChains(driver)\
-            .scroll_from_origin(scroll_origin, 0, 0)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 1)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 2)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 3)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 4)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 5)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 5)\
-            .pause(0.1)\
-            .scroll_from_origin(scroll_origin, 0, delta_y * 6)\
-            .perform()
+        # an empty result is often a glitch, refresh a few times before giving up on the search
+        try:
+            interaction.retry(wait_for_results, attempts=3, recover=refresh_results, trip=False)
+        except TimeoutException:
+            logger.info("Parse Job: no results")
+            break
+
+        cards = interaction.retry(lambda: read_cards(preload_jobs_list()))
 
         # parse each job
-        for job in job_list:
+        for id, title, company, location in cards:
             # check id exists
-            id = job.get_attribute("data-occludable-job-id")
             if not id:
                 continue
 
             # check database if id has been parsed already
             if db.id_exists(id) is True:
+                if int(id) == resume_id:
+                    # the previous run stopped here, the jobs after it weren't parsed
+                    logger.info(f"Resuming after job {resume_id}")
+                    resume_id = None
+                    seeking = False
+                    repeat_counter = 0
+                    continue
+                if seeking:
+                    continue
                 repeat_counter += 1
                 # Stop parsing if encountered multiple viewed jobs in a row
                 if (repeat_counter > 4):
+                    if resume_id is not None and resume_page <= page_i:
+                        # caught up with the previous run before its last job, keep reading until it shows up.
+                        # new postings push it to later pages, removed ones pull unparsed jobs onto this one
+                        logger.info(f"Looking for job {resume_id}")
+                        seeking = True
+                        seek_limit = page_i + SEEK_PAGES
+                        continue
                     logger.info("Stopping parse.")
                     stop_parsing = True
                     break
                 continue
-            
-            try:
-                title = job.find_element(By.TAG_NAME, "strong").text
-                company = job.find_element(By.CLASS_NAME, "artdeco-entity-lockup__subtitle").text
-                location = job.find_element(By.CLASS_NAME, "artdeco-entity-lockup__caption").text
-
-                # if (excluded titles) or (excluded companies) or (excluded location)
-                if (
-                    any(substr in title for substr in excluded_titles_set)
-                    or any(company in excluded_company for excluded_company in excluded_companies_set)
-                    or any(location in excluded_location for excluded_location in excluded_locations_set)
-                ):
-                    db.create(JobDB(Job(id, title, company, location), stage=STAGE_PARSE, discarded=True))
-                    continue
 
-            except NoSuchElementException:
+            # card not loaded yet
+            if title is None or company is None or location is None:
                 continue
-            
-            db.create(JobDB(Job(id, title, company, location), stage=STAGE_PARSE, discarded=False))
+
+            # if (excluded titles) or (excluded companies) or (excluded location) or (outside location_filter)
+            if (
+                any(substr in title for substr in excluded_titles_set)
+                or any(company in excluded_company for excluded_company in excluded_companies_set)
+                or any(location in excluded_location for excluded_location in excluded_locations_set)
+                or (location_filter is not None and location_filter.is_excluded(location, search_location))
+            ):
+                db.create(JobDB(Job(id, title, company, location), stage=STAGE_PARSE, discarded=True, search=search_title))
+                runstats.count("jobs_in")
+                resume.advance_cursor(db, cursor, page_i, int(id))
+                continue
+
+            db.create(JobDB(Job(id, title, company, location), stage=STAGE_PARSE, discarded=False, search=search_title))
+            runstats.count("jobs_in")
             parsed_jobs.append(Job(id, title, company, location))
-        
+            resume.advance_cursor(db, cursor, page_i, int(id))
+
         # reset counter on each page
         repeat_counter = 0
+        if seeking and page_i >= seek_limit:
+            # the job is gone from the results, parse normally from here
+            logger.info(f"Job {resume_id} not found, resuming from page {page_i + 1}")
+            seeking = False
+            resume_id = None
         if stop_parsing:
-            break
+            if resume_page <= page_i:
+                break
+            # caught up with the previous run, skip to the page it stopped on and look for its last job there
+            logger.info(f"Skipping to page {resume_page}")
+            driver.get(f"{driver.current_url}&start={25 * (resume_page - 1)}")
+            wait.until(ExpectedConditions.title_contains("Jobs"))
+            page_i = resume_page
+            seeking = resume_id is not None
+            seek_limit = page_i + SEEK_PAGES
+            stop_parsing = False
+            continue
 
         # go to next page
         try:
@@ -324,123 +453,214 @@ def parse_jobs(db: Database, filters: dict, parse_viewed = False) -> list[Job]:
             next_page = f"{current_url}&start={25 * page_i}"
             driver.get(next_page)
             wait.until(ExpectedConditions.title_contains("Jobs"))
+            page_i += 1
         else:
             logger.info("Parse Job: Reached last page")
             break
 
+    resume.clear_cursor(db, cursor)
+    parsed_jobs = resume.merge_interrupted(db, parsed_jobs, STAGE_PARSE, search_title)
+
     logger.info(f"Total: {len(parsed_jobs)} jobs")
     return parsed_jobs
 
-def match_keywords(jobs_list: list[Job], db: Database, filters: dict, threshold = 2) -> list[Job]:
+def match_keywords(jobs_list: list[Job], db: Database, profiles: list[Profile], title: str) -> list[Job]:
     logger.info("Matching Keywords...")
-    match_keywords_set = set(filters['match_keywords'])
-
-    new_jobs_list = append_interrupted_jobs(db, jobs_list, STAGE_KEYWD)
+    new_jobs_list = []
     
     for job in jobs_list:
-        marked_error = False
-        
         # go to job url
+        fetch_throttle.wait()
         driver.get(f"https://www.linkedin.com/jobs/view/{job.id}")
-        time.sleep(3.2) # will get http 429 error without this (too many requests)
 
-        attempts = 0
-        while attempts < 4:
-            try:
-                wait.until(ExpectedConditions.presence_of_element_located((By.TAG_NAME, "Article")))
-                description = driver.find_element(By.ID, "job-details")
-            except NoSuchElementException:
-                print("keyword stage exception.")
-                if attempts >= 3:
-                    marked_error = True
-                    break
-                driver.refresh()
-                time.sleep(1 + attempts)
-            attempts += 1
-        
-        desc_lower = description.text.lower()
+        try:
+            description = interaction.retry(load_description, attempts=4, recover=refresh_description, base=FETCH_DELAY)
+        except interaction.RateLimitedError:
+            # not the job's fault, it stays at the parse stage and is resumed by the next run
+            logger.warning(f"Rate limited, skipped {job.id}")
+            continue
+        except interaction.RETRY_EXCEPTIONS:
+            description = ""
 
-        if marked_error or not desc_lower:
+        desc_lower = description.lower()
+
+        if not desc_lower:
             db.update(job.id, stage=STAGE_KEYWD, discarded=True, keywords="ERROR")
-            print(f"marked invalid: {job.id}")
+            logger.warning(f"marked invalid: {job.id}")
             continue
 
-        # check description and add to list if it meets/exceeds threshold
-        # threshold should be adjustable through parameter
-        count = 0
-        matched_keywords = []
-        for keyword in match_keywords_set:
-            if keyword.lower() in desc_lower:
-                count += 1
-                matched_keywords.append(keyword)
-
-        if count >= threshold:
-            job.description = description.text.strip()
-            job.matching_keywords = matched_keywords
-            keywords_str = json.dumps(matched_keywords)
-            db.update(job.id, description=job.description, keywords=keywords_str, stage=STAGE_KEYWD)
+        job.description = description.strip()
+        simhash = fingerprint.simhash(job)
+        db.create_fingerprint(job.id, simhash)
+
+        # check description against every profile, a profile matches if it meets/exceeds its threshold
+        similar = find_similar_verdicts(db, job, simhash, profiles, title)
+        verdicts = {}
+        for profile in profiles:
+            matched_keywords = profile.match_keywords(desc_lower)
+            is_match = profile.is_keyword_match(matched_keywords)
+            qualified = similar.get(profile.name) if is_match else False
+            verdicts[profile.name] = (is_match, matched_keywords, qualified)
+
+        if save_keyword_matches(db, job, verdicts):
             new_jobs_list.append(job)
-        else:
-            db.update(job.id, stage=STAGE_KEYWD, discarded=True)
     
+    new_jobs_list = resume.merge_interrupted(db, new_jobs_list, STAGE_KEYWD, title)
     logger.info(f"{len(new_jobs_list)} matches out of {len(jobs_list)}")
     return new_jobs_list
 
-def match_qualifications(jobs_list: list[Job], db: Database, education, years_exp) -> list[Job]:
+def load_description() -> str:
+    if is_rate_limited():
+        runstats.count("http_429")
+        interaction.breaker.failure()
+        raise interaction.RateLimitedError()
+    # waits for the description text itself, the article can render before it
+    return wait.until(lambda d: d.find_element(By.ID, "job-details").text)
+
+def refresh_description():
+    fetch_throttle.wait()
+    driver.refresh()
+
+def save_keyword_matches(db: Database, job: Job, verdicts: dict) -> bool:
+    # store each profile's keyword verdict, returns True if any profile matched
+    job.matching_keywords = sorted({k for is_match, keywords, _ in verdicts.values() if is_match for k in keywords})
+    job.profiles = {name: v[2] for name, v in verdicts.items() if v[0]}
+    for name, (is_match, keywords, qualified) in verdicts.items():
+        db.update_profile_match(job.id, name, keyword_match=is_match, keywords=json.dumps(keywords),
+                                qualified=qualified if is_match else None)
+
+    if job.profiles:
+        db.update(job.id, description=job.description, keywords=json.dumps(job.matching_keywords), stage=STAGE_KEYWD)
+        return True
+    db.update(job.id, stage=STAGE_KEYWD, discarded=True)
+    return False
+
+def match_qualifications(jobs_list: list[Job], db: Database, profiles: list[Profile], title: str) -> list[Job]:
     logger.info("Matching Qualifications...")
-    new_jobs_list = append_interrupted_jobs(db, jobs_list, STAGE_QUALF)
+    new_jobs_list = []
+    skipped_calls = 0
+    start = time.perf_counter()
+    profiles_by_name = {profile.name: profile for profile in profiles}
 
     for job in jobs_list:
-        is_match = inference.job_desc_match_qualifications(job.description, education, years_exp)
-        if is_match is True:
+        job_profiles = load_job_profiles(db, job, profiles)
+        pending = [name for name, qualified in job_profiles.items() if qualified is None]
+
+        if pending:
+            # questions are asked once per job, the answers are matched against each profile
+            inference_throttle.wait()
+            answers = inference.question_answer(inference.QUESTION_SETS, job.description)
+            for name in pending:
+                years_exp = profiles_by_name[name].years_exp.get(title)
+                job_profiles[name] = inference.match_answers(answers, job.description, int(years_exp))
+                db.update_profile_match(job.id, name, qualified=job_profiles[name])
+        else:
+            # verdicts reused from a near-duplicate description
+            skipped_calls += 1
+
+        if any(job_profiles.values()):
             db.update(job.id, stage=STAGE_QUALF)
             new_jobs_list.append(job)
         else:
             # remove description to save space on DB
             db.update(job.id, description='', stage=STAGE_QUALF, discarded=True)
-        time.sleep(1)
     
+    new_jobs_list = resume.merge_interrupted(db, new_jobs_list, STAGE_QUALF, title)
     logger.info(f"{len(new_jobs_list)} matches out of {len(jobs_list)}")
+    if skipped_calls > 0:
+        logger.info(f"Reused {skipped_calls} qualification verdict(s), skipped inference "
+                    f"(stage took {time.perf_counter() - start:.1f}s)")
     return new_jobs_list
 
-def append_interrupted_jobs(db: Database, jobs_list: list[Job], stage: str) -> list[Job]:
-    job_ids = [job.id for job in jobs_list]
-    counter = 0
-
-    # get all cached jobs that haven't been discarded (resume processing)
-    cached_list: list[JobDB] = db.get_all_stage(stage=stage, discarded=False)
-    for job_db in cached_list:
-        cached_id = job_db.info.id
-        if cached_id not in job_ids:
-            jobs_list.append(job_db.info)
-            counter += 1
-    
-    if counter > 0:
-        logger.info(f"Including {counter} interrupted job(s) found in database...")
-
-    return jobs_list
+def load_job_profiles(db: Database, job: Job, profiles: list[Profile]) -> dict[str, bool | None]:
+    # profile -> qualified for the profiles whose keywords matched, loaded from the DB for resumed jobs
+    if job.profiles is None:
+        matches = db.get_profile_matches(job.id)
+        if not matches and any(profile.name == DEFAULT_PROFILE for profile in profiles):
+            # judged before profiles were added
+            job.profiles = {DEFAULT_PROFILE: None}
+        else:
+            # verdicts of profiles renamed, removed or not following this search are ignored
+            names = {profile.name for profile in profiles}
+            job.profiles = {name: v[2] for name, v in matches.items() if v[0] and name in names}
+    return job.profiles
+
+def get_verdict(row) -> tuple[bool, list[str], bool] | None:
+    # (keyword match, matched keywords, qualified) of a judged job, qualified is None if not judged yet
+    if row is None:
+        return None
+    _, _, stage, discarded, keywords = row
+    if stage == STAGE_KEYWD:
+        if keywords == "ERROR":
+            return None
+        if discarded:
+            return (False, [], False)
+        return (True, json.loads(keywords or '[]'), None)
+    if stage == STAGE_QUALF:
+        return (True, json.loads(keywords or '[]'), not discarded)
+    if stage in (STAGE_MATCH, STAGE_PREP_SEND, STAGE_CMPLT):
+        return (True, json.loads(keywords or '[]'), True)
+    return None
+
+def get_verdicts(db: Database, row, profiles: list[Profile]) -> dict[str, tuple] | None:
+    # per profile verdicts of a judged job, None unless every profile was judged
+    verdict = get_verdict(row)
+    if verdict is None:
+        return None
+    matches = db.get_profile_matches(row[0])
+    if not matches and [profile.name for profile in profiles] == [DEFAULT_PROFILE]:
+        # judged before profiles were added
+        matches = {DEFAULT_PROFILE: verdict}
+    if any(profile.name not in matches for profile in profiles):
+        return None
+    return {profile.name: matches[profile.name] for profile in profiles}
+
+def find_similar_verdicts(db: Database, job: Job, simhash: int, profiles: list[Profile], title: str) -> dict[str, bool]:
+    # qualification verdicts of the closest near-duplicate description judged for the same search
+    for row in db.find_similar(job.id, simhash, title):
+        if fingerprint.distance(simhash, row[1]) > fingerprint.MAX_DISTANCE:
+            continue
+        verdicts = get_verdicts(db, row, profiles)
+        if verdicts is None:
+            continue
+        qualified = {name: v[2] for name, v in verdicts.items() if v[0] and v[2] is not None}
+        if qualified:
+            logger.info(f"Near-duplicate of {row[0]}: reusing qualification verdict for {job.id}")
+            return qualified
+    return {}
 
-def send_jobs(db: Database, json_response: JobResponse, completed_ids):
+def send_jobs(db: Database, sender: outbox.OutboxSender, batches: list, completed_ids):
     logger.info("Sending jobs...")
-    response = requests.post(f"{os.getenv('BOT_URL')}/receive", json=json_response.model_dump())
-    response.raise_for_status()
-    
-    for id in completed_ids:
-        db.update(id, stage=STAGE_CMPLT)
-
-def send_error(error):
+    # profiles without a search in this run get nothing, the bot still needs one final batch to finish the run
+    batches = [batch for batch in batches if batch.searches] or batches[:1]
+    for i, batch in enumerate(batches):
+        # the bot treats the run as finished after the final batch
+        batch.batch = i
+        batch.final = i == len(batches) - 1
+
+    # stored with the stage change, jobs are completed once the bot acknowledges them
+    outbox.enqueue_jobs(db, batches, completed_ids)
+    sender.notify()
+
+def send_error(db: Database, sender: outbox.OutboxSender, report):
     logger.info("Sending error message...")
-    requests.post(f"{os.getenv('BOT_URL')}/error", json={"error": error})
+    if db is None:
+        # no database to queue the error in, one direct attempt
+        try:
+            outbox.deliver(outbox.KIND_ERROR, report.model_dump_json())
+        except Exception as e:
+            logger.error(f"Unable to send error message: {e}")
+        return
+    outbox.enqueue_error(db, report)
+    if sender is not None:
+        sender.notify()
 
 def load_filters():
     with open('filters.json', 'r') as f:
         return json.load(f)
 
-def truncate(str, max_len):
-    if len(str) > max_len:
-        return str[:max_len] + "..."
-    else:
-        return str
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    logging.basicConfig(level='INFO')
+    logger.info("parse.py starting.")
+    # optional search titles to run, all searches by default
+    main(sys.argv[1:])
\ No newline at end of file
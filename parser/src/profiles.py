@@ -0,0 +1,50 @@
+DEFAULT_PROFILE = "default"
+DEFAULT_THRESHOLD = 2
+
+
+class Profile:
+    def __init__(self, name: str, education: str, years_exp: dict, match_keywords: list[str],
+            threshold: int = DEFAULT_THRESHOLD, channel_id: int = None):
+        self.name = name
+        self.education = education
+        self.years_exp = years_exp
+        self.keywords = match_keywords
+        self.threshold = threshold
+        self.channel_id = channel_id
+        self.keywords_lower = [(keyword, keyword.lower()) for keyword in set(match_keywords)]
+
+    def __str__(self):
+        return self.name
+
+    def applies_to(self, title: str) -> bool:
+        # a profile only follows the searches it has years of experience for
+        return title in self.years_exp
+
+    def match_keywords(self, desc_lower: str) -> list[str]:
+        return [keyword for keyword, lower in self.keywords_lower if lower in desc_lower]
+
+    def is_keyword_match(self, matched_keywords: list[str]) -> bool:
+        return len(matched_keywords) >= self.threshold
+
+
+def load_profiles(filters: dict) -> list[Profile]:
+    if 'profiles' not in filters:
+        # single user filters.json
+        return [Profile(DEFAULT_PROFILE, filters['user']['education'], filters['user']['years_exp'],
+                        filters['match_keywords'])]
+
+    return [
+        Profile(
+            name,
+            profile['education'],
+            profile['years_exp'],
+            profile['match_keywords'],
+            threshold=profile.get('threshold', DEFAULT_THRESHOLD),
+            channel_id=profile.get('channel_id')
+        )
+        for name, profile in filters['profiles'].items()
+    ]
+
+
+def all_keywords(profiles: list[Profile]) -> list[str]:
+    return sorted({keyword for profile in profiles for keyword in profile.keywords})
@@ -1,21 +1,45 @@
+import csv
+import io
 import json
 import os
 import subprocess
 import sys
+import tempfile
+import time
 import traceback
 import uuid
+from datetime import date, datetime, time as day_time
 
-from fastapi import Body, FastAPI
-from fastapi.responses import Response
+from dotenv import load_dotenv
+from fastapi import Body, Depends, FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+import filterfile
+import outbox
+from Database import SECONDS_PER_DAY, Database
 
 app = FastAPI()
-filters_file = 'filters.json'
+filters_file = filterfile.FILTERS_FILE
+
+# sends messages a parser run could not deliver before it exited
+sender: outbox.OutboxSender = None
+
+EXPORT_COLUMNS = ["id", "title", "company", "location", "search", "stage", "discarded", "keywords", "first_seen", "url", "score"]
+
+@app.on_event("startup")
+def start_outbox():
+    global sender
+    load_dotenv()
+    sender = outbox.OutboxSender(Database())
+    sender.start()
 
 @app.get("/run")
-def run():
+def run(search: list[str] = Query(default=[])):
     response = Response(status_code=202)
     try:
-        subprocess.Popen([sys.executable, "parse.py"])
+        # runs only the given search titles, or every search if none are given
+        subprocess.Popen([sys.executable, "parse.py", *search])
     except Exception:
         response = {
             "message": "Parser execution failed", 
@@ -26,15 +50,90 @@ def run():
 @app.put("/exclude-company", status_code=200)
 def exclude_company(body: dict = Body(...)):
     word = body['word']
-    add_excluded_word(key='excluded_companies', value=word)
+    filterfile.add_excluded_words('excluded_companies', [word], filters_file)
     return word
 
 @app.put("/exclude-title", status_code=200)
 def exclude_title(body: dict = Body(...)):
     word = body['word']
-    add_excluded_word(key='excluded_title_words', value=word)
+    filterfile.add_excluded_words('excluded_title_words', [word], filters_file)
     return word
 
+@app.get("/stats/runs")
+def stats_runs(days: int = Query(default=7, ge=1)):
+    with Database() as db:
+        return db.get_run_summary(since=time.time() - days * SECONDS_PER_DAY)
+
+@app.get("/stats/trend")
+def stats_trend(days: int = Query(default=30, ge=1), window: int = Query(default=7, ge=1)):
+    with Database() as db:
+        return db.get_run_trend(since=time.time() - days * SECONDS_PER_DAY, window=window)
+
+@app.get("/stats/stages")
+def stats_stages(days: int = Query(default=7, ge=1)):
+    with Database() as db:
+        return db.get_stage_summary(since=time.time() - days * SECONDS_PER_DAY)
+
+def job_filters(
+    stage: str = None,
+    search: str = None,
+    company: str = None,
+    keyword: str = None,
+    since: date = None,
+    until: date = None,
+    discarded: bool = None,
+    q: str = Query(default=None, description="full text search over title, company and description"),
+    description: bool = False,
+) -> dict:
+    # since/until are inclusive days on which the job was first parsed
+    return {
+        "stage": stage,
+        "search": search,
+        "company": company,
+        "keyword": keyword,
+        "since": datetime.combine(since, day_time.min).timestamp() if since else None,
+        "until": datetime.combine(until, day_time.min).timestamp() + SECONDS_PER_DAY if until else None,
+        "discarded": discarded,
+        "text": to_match_query(q) if q else None,
+        "description": description,
+    }
+
+@app.get("/jobs")
+def jobs(after_id: int = 0, limit: int = Query(default=100, ge=1, le=1000), filters: dict = Depends(job_filters)):
+    with Database() as db:
+        page = db.get_jobs(after_id=after_id, limit=limit, **filters)
+    # pass next_after_id back as after_id for the next page
+    return {"jobs": page, "next_after_id": page[-1]["id"] if len(page) == limit else None}
+
+@app.get("/jobs/stream")
+def jobs_stream(after_id: int = 0, filters: dict = Depends(job_filters)):
+    def ndjson():
+        with Database() as db:
+            for job in db.iter_jobs(after_id=after_id, **filters):
+                yield json.dumps(job) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.get("/jobs/export")
+def jobs_export(format: str = Query(default="csv", pattern="^(csv|parquet)$"), filters: dict = Depends(job_filters)):
+    columns = EXPORT_COLUMNS + (["description"] if filters["description"] else [])
+    if format == "parquet":
+        return export_parquet(filters, columns)
+
+    def rows():
+        with Database() as db:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=columns)
+            writer.writeheader()
+            for job in db.iter_jobs(**filters):
+                writer.writerow({**job, "keywords": ";".join(job["keywords"])})
+                if buffer.tell() > 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+    return StreamingResponse(rows(), media_type="text/csv",
+                             headers={"Content-Disposition": "attachment; filename=jobs.csv"})
+
 @app.get("/ping")
 def pong():
     return "pong"
@@ -44,16 +143,35 @@ def shutdown():
     subprocess.run(["shutdown", "-s"])
     sys.exit(0)
 
-def add_excluded_word(key, value):
-    with open(filters_file, 'r') as f:
-        data = json.load(f)
-        data[key].append(value)
-    
-    # create randomly named temporary file to avoid 
-    # interference with other thread/asynchronous request (thanks stackoverflow)
-    temp_file = os.path.join(os.path.dirname(filters_file), str(uuid.uuid4()))
-
-    with open(temp_file, 'w') as f:
-        json.dump(data, f, indent=4)
-    
-    os.replace(temp_file, filters_file)
\ No newline at end of file
+def to_match_query(text: str) -> str:
+    # each word is quoted so user input is never parsed as fts5 query syntax
+    return " ".join('"%s"' % word.replace('"', '""') for word in text.split())
+
+def export_parquet(filters: dict, columns: list[str]):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pyarrow.schema([
+        (column, pyarrow.int64() if column == "id"
+            else pyarrow.bool_() if column == "discarded"
+            else pyarrow.list_(pyarrow.string()) if column == "keywords"
+            else pyarrow.float64() if column == "score"
+            else pyarrow.string())
+        for column in columns
+    ])
+    # written one row group per batch, the file is removed once it has been sent
+    temp_file = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.parquet")
+    with Database() as db, pyarrow.parquet.ParquetWriter(temp_file, schema) as writer:
+        batch = []
+        for job in db.iter_jobs(**filters):
+            batch.append(job)
+            if len(batch) == 500:
+                writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+    return FileResponse(temp_file, media_type="application/vnd.apache.parquet", filename="jobs.parquet",
+                        background=BackgroundTask(os.remove, temp_file))
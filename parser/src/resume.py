@@ -0,0 +1,67 @@
+import logging
+
+from Database import Database
+from Job import Job
+from JobDB import JobDB
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCursor:
+    def __init__(self, search: str, location: str, page: int = 0, last_id: int = None):
+        self.search = search
+        self.location = location
+        self.page = page
+        self.last_id = last_id
+
+    def __str__(self):
+        return "\"%s\" in %s: page %s, last id %s" % (self.search, self.location, self.page, self.last_id)
+
+
+def merge_interrupted(db: Database, jobs_list: list[Job], stage: str, search: str) -> list[Job]:
+    # returns a new work queue, jobs_list is never modified
+    # only jobs parsed for this search are resumed, a later search of the same run would
+    # otherwise pick up jobs an earlier one already qualified but hasn't sent yet
+    queue: dict[int, Job] = {}
+    for job in jobs_list:
+        queue[int(job.id)] = job
+
+    # get all cached jobs that haven't been discarded (resume processing)
+    counter = 0
+    cached_list: list[JobDB] = db.get_all_stage(stage=stage, discarded=False, search=search)
+    for job_db in cached_list:
+        cached_id = int(job_db.info.id)
+        if cached_id not in queue:
+            queue[cached_id] = job_db.info
+            counter += 1
+
+    if counter > 0:
+        logger.info(f"Including {counter} interrupted job(s) found in database...")
+
+    return list(queue.values())
+
+
+def load_cursor(db: Database, search: str, location: str) -> ParseCursor | None:
+    row = db.get_cursor(search, location)
+    if row is None:
+        return None
+    cursor = ParseCursor(search, location, page=row[0], last_id=row[1])
+    logger.info(f"Resuming parse from cursor: {cursor}")
+    return cursor
+
+
+def save_cursor(db: Database, cursor: ParseCursor):
+    db.update_cursor(cursor.search, cursor.location, cursor.page, cursor.last_id)
+
+
+def advance_cursor(db: Database, cursor: ParseCursor, page: int, job_id: int):
+    # saved after every stored job, a run killed mid-page resumes after the last job it stored.
+    # new postings on earlier pages don't move the cursor back
+    if page >= cursor.page:
+        cursor.page = page
+        cursor.last_id = job_id
+        save_cursor(db, cursor)
+
+
+def clear_cursor(db: Database, cursor: ParseCursor):
+    db.delete_cursor(cursor.search, cursor.location)
@@ -0,0 +1,68 @@
+import logging
+import time
+
+from Database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    def __init__(self, search: str, stage: str, jobs_in: int = 0):
+        self.search = search
+        self.stage = stage
+        self.started = time.time()
+        self.ended = None
+        self.jobs_in = jobs_in
+        self.jobs_out = 0
+        self.pages = 0
+        self.retries = 0
+        self.http_429 = 0
+        self.inference_calls = 0
+
+
+class RunRecorder:
+    def __init__(self, db: Database, searches: list[str]):
+        self.db = db
+        self.run_id = db.create_run(time.time(), searches)
+        self.stage: StageStats = None
+
+    def start_stage(self, search: str, stage: str, jobs_in: int = 0):
+        self.stage = StageStats(search, stage, jobs_in)
+
+    def end_stage(self, jobs_out: int, jobs_in: int = None):
+        stats = self.stage
+        if stats is None:
+            return
+        stats.ended = time.time()
+        stats.jobs_out = jobs_out
+        if jobs_in is not None:
+            stats.jobs_in = jobs_in
+        self.db.save_run_stage(self.run_id, stats.search, stats.stage, stats.started, stats.ended,
+                               stats.jobs_in, stats.jobs_out, stats.pages, stats.retries,
+                               stats.http_429, stats.inference_calls)
+        self.stage = None
+
+    def count(self, counter: str, n: int = 1):
+        if self.stage is not None:
+            setattr(self.stage, counter, getattr(self.stage, counter) + n)
+
+    def finish(self, status: str):
+        # saves a stage left open by an error so its counters are kept
+        if self.stage is not None:
+            self.end_stage(jobs_out=0)
+        self.db.finish_run(self.run_id, time.time(), status)
+
+
+# recorder of the run in progress, counting is a no-op outside of a run
+current: RunRecorder = None
+
+
+def start_run(db: Database, searches: list[str]) -> RunRecorder:
+    global current
+    current = RunRecorder(db, searches)
+    return current
+
+
+def count(counter: str, n: int = 1):
+    if current is not None:
+        current.count(counter, n)
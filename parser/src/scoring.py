@@ -0,0 +1,162 @@
+import logging
+import re
+import time
+from collections import Counter
+from itertools import chain, repeat
+
+import numpy as np
+from scipy import sparse
+
+from Database import Database
+from Job import Job
+from profiles import Profile
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[a-z0-9+#]{2,}")
+KEYWORD_WEIGHT = 3.0    # filters.json keywords count more than words from past matches
+HISTORY_WEIGHT = 1.0
+
+
+def tokenize(text: str) -> list[str]:
+    return WORD_RE.findall((text or "").lower())
+
+
+class TfidfIndex:
+    def __init__(self, terms: list[str] = None, df: list[int] = None, n_docs: int = 0):
+        self.terms = terms or []
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.df = np.array(df or [], dtype=np.float64)
+        self.new_df = np.zeros(len(self.terms))
+        self.n_docs = n_docs
+
+    @classmethod
+    def load(cls, db: Database):
+        terms, df, n_docs = db.get_tfidf_index()
+        return cls(terms, df, n_docs)
+
+    def save(self, db: Database, doc_ids: list[int], scores: list[float]):
+        # only the document frequency changes since the last save are written
+        changed = np.flatnonzero(self.new_df)
+        db.update_tfidf_index([(self.terms[i], int(self.new_df[i])) for i in changed], doc_ids, scores)
+        self.new_df = np.zeros(len(self.terms))
+
+    def add_terms(self, token_lists: list[list[str]]):
+        new_terms = set(chain.from_iterable(token_lists)).difference(self.vocabulary)
+        for term in sorted(new_terms):
+            self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+        self.df = np.concatenate([self.df, np.zeros(len(new_terms))])
+        self.new_df = np.concatenate([self.new_df, np.zeros(len(new_terms))])
+
+    def add_documents(self, counts: sparse.csr_matrix):
+        # each (document, term) pair appears once in the summed count matrix
+        added = np.bincount(counts.indices, minlength=len(self.terms))
+        self.df += added
+        self.new_df += added
+        self.n_docs += counts.shape[0]
+
+    def idf(self) -> np.ndarray:
+        return np.log((1 + self.n_docs) / (1 + self.df)) + 1
+
+    def counts(self, token_lists: list[list[str]]) -> sparse.csr_matrix:
+        all_tokens = list(chain.from_iterable(token_lists))
+        cols = np.fromiter(map(self.vocabulary.get, all_tokens, repeat(-1)), dtype=np.int64, count=len(all_tokens))
+        rows = np.repeat(np.arange(len(token_lists)), [len(tokens) for tokens in token_lists])
+        known = cols >= 0
+        data = np.ones(np.count_nonzero(known))
+        # duplicate (row, col) pairs are summed into term counts
+        return sparse.csr_matrix((data, (rows[known], cols[known])), shape=(len(token_lists), len(self.terms)))
+
+    def transform(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        matrix = counts.copy()
+        matrix.data = 1 + np.log(matrix.data)   # sublinear tf
+        matrix = matrix.multiply(self.idf()).tocsr()
+        norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ matrix
+
+
+def rebuild_index(db: Database) -> int:
+    # expired jobs leave the index, document frequencies are recounted from the descriptions still stored
+    start = time.perf_counter()
+    df = Counter(chain.from_iterable(set(tokenize(description)) for description in db.get_indexed_descriptions()))
+    db.replace_tfidf_index(sorted(df.items()))
+    logger.info(f"Rebuilt tf-idf index with {len(df)} term(s) in {time.perf_counter() - start:.2f}s")
+    return len(df)
+
+
+def history_centroid(index: TfidfIndex, history: list[str]) -> np.ndarray:
+    # centroid of descriptions that were matched in earlier runs
+    if not history:
+        return np.zeros(len(index.terms))
+    counts = index.counts([tokenize(description) for description in history])
+    return np.asarray(index.transform(counts).mean(axis=0)).ravel()
+
+
+def build_profile(index: TfidfIndex, keywords: list[str], centroid: np.ndarray) -> np.ndarray:
+    profile = HISTORY_WEIGHT * centroid
+    keyword_tokens = [t for keyword in keywords for t in tokenize(keyword)]
+    if keyword_tokens:
+        profile = profile + KEYWORD_WEIGHT * index.transform(index.counts([keyword_tokens])).toarray()[0]
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm > 0 else profile
+
+
+def score_descriptions(index: TfidfIndex, profiles: np.ndarray, counts: sparse.csr_matrix) -> np.ndarray:
+    # cosine similarity, rows and profiles are all l2 normalized. one column per profile
+    # for a (profiles, terms) matrix, a single profile vector gives a single score per row
+    return index.transform(counts) @ profiles.T
+
+
+def rank_jobs(jobs_list: list[Job], db: Database, profiles: list[Profile], history: list[str]) -> list[Job]:
+    logger.info("Scoring Jobs...")
+    start = time.perf_counter()
+
+    index = TfidfIndex.load(db)
+    scored_jobs = [job for job in jobs_list if job.description]
+    token_lists = [tokenize(job.description) for job in scored_jobs]
+
+    index.add_terms(token_lists)
+    counts = index.counts(token_lists)
+
+    # resumed jobs are already counted in the index
+    indexed_ids = db.get_indexed_ids([int(job.id) for job in scored_jobs])
+    new_rows = [i for i, job in enumerate(scored_jobs) if int(job.id) not in indexed_ids]
+    index.add_documents(counts[new_rows])
+
+    # each profile is scored against its own keywords, the history of matched descriptions is shared
+    centroid = history_centroid(index, history)
+    vectors = np.array([build_profile(index, profile.keywords, centroid) for profile in profiles])
+    scores = score_descriptions(index, vectors, counts).reshape(len(scored_jobs), len(profiles))
+    for job, row in zip(scored_jobs, scores):
+        job.scores = {profile.name: float(score) for profile, score in zip(profiles, row)}
+        job.score = max(job.scores.values())
+    index.save(db, [int(job.id) for job in scored_jobs], [job.score for job in scored_jobs])
+    db.update_profile_scores([(score, int(job.id), name) for job in scored_jobs for name, score in job.scores.items()])
+
+    # the best score of any profile orders the queue, jobs without a description keep their place at the end
+    ranked = sorted(jobs_list, key=lambda job: job.score if job.score is not None else -1, reverse=True)
+    logger.info(f"Scored {len(scored_jobs)} job(s) in {time.perf_counter() - start:.2f}s")
+    return ranked
+
+
+if __name__ == "__main__":
+    # benchmark scoring a synthetic 10k job batch
+    logging.basicConfig(level='INFO')
+    rng = np.random.default_rng(0)
+    words = [f"word{i}" for i in range(20000)]
+    token_lists = [[words[i] for i in rng.integers(len(words), size=300)] for _ in range(10000)]
+
+    start = time.perf_counter()
+    index = TfidfIndex()
+    index.add_terms(token_lists)
+    counts = index.counts(token_lists)
+    index.add_documents(counts)
+    logger.info(f"Indexed {counts.shape[0]} descriptions in {time.perf_counter() - start:.3f}s")
+
+    profile = build_profile(index, words[:10], history_centroid(index, [" ".join(tokens) for tokens in token_lists[:200]]))
+
+    start = time.perf_counter()
+    scores = score_descriptions(index, profile, counts)
+    logger.info(f"Scored {len(scores)} descriptions in {time.perf_counter() - start:.3f}s")